@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+Connection rate benchmark
+
+Runs a TCP server that closes each connection as soon as it's accepted,
+with clients in separate processes that open connections in bursts, as
+fast as they can. Reports accepts per second, loop iterations per accept,
+and (on Linux) how many times the listen queue overflowed, for
+TcpServer.accept_batch of 1 and of the default.
+
+Usage: bench_accept.py [--edge] [clients] [bursts] [burst size] [backlog]
+"""
+
+import subprocess
+import socket
+import sys
+import time
+
+import thor.loop
+from thor.tcp import TcpServer, server_listen
+
+
+def listen_overflows():
+    "Return the system's count of listen queue overflows, if available."
+    try:
+        with open('/proc/net/netstat') as fh:
+            lines = fh.readlines()
+    except IOError:
+        return None
+    for names, values in zip(lines[::2], lines[1::2]):
+        if names.startswith('TcpExt:'):
+            counts = dict(zip(names.split()[1:], values.split()[1:]))
+            return int(counts.get('ListenOverflows', 0))
+    return None
+
+
+def run_client(port, bursts, size):
+    for i in range(bursts):
+        socks = [socket.create_connection(('127.0.0.1', port))
+                 for j in range(size)]
+        for sock in socks:
+            sock.close()
+
+
+def run_server(edge, batch, clients, bursts, size, backlog):
+    loop = thor.loop.make(edge_triggered=edge)
+    sock = server_listen('127.0.0.1', 0, backlog=backlog)
+    server = TcpServer('127.0.0.1', 0, sock=sock, loop=loop)
+    server.accept_batch = batch
+    port = sock.getsockname()[1]
+    total = clients * bursts * size
+    state = {'accepted': 0}
+
+    def handle_conn(conn):
+        conn.close()
+        state['accepted'] += 1
+        if state['accepted'] == total:
+            loop.stop()
+    server.on('connect', handle_conn)
+
+    overflows = listen_overflows()
+    procs = [subprocess.Popen([sys.executable, __file__, '--client',
+                               str(port), str(bursts), str(size)])
+             for i in range(clients)]
+    start = time.perf_counter()
+    loop.run()
+    elapsed = time.perf_counter() - start
+    for proc in procs:
+        proc.wait()
+    server.shutdown()
+    if overflows is not None:
+        overflows = listen_overflows() - overflows
+    return total / elapsed, loop.stats.iterations / total, overflows
+
+
+def main(args):
+    edge = '--edge' in args
+    args = [int(a) for a in args if not a.startswith('--')]
+    clients, bursts, size, backlog = \
+        (args + [4, 50, 100, 128][len(args):])[:4]
+    print("%s: %d clients x %d bursts of %d connections, backlog %d:" % (
+        edge and 'edge-triggered' or 'level-triggered', clients, bursts,
+        size, backlog))
+    for batch in [1, TcpServer.accept_batch]:
+        rate, iterations, overflows = run_server(
+            edge, batch, clients, bursts, size, backlog)
+        print("  accept_batch %3d: %8.0f accepts/sec  %.2f iterations/accept"
+              "  listen overflows: %s" % (batch, rate, iterations, overflows))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--client']:
+        run_client(*[int(a) for a in sys.argv[2:5]])
+    else:
+        main(sys.argv[1:])
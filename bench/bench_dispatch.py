@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+FD event dispatch benchmark
+
+Keeps a number of sockets readable and measures how many events per second
+the loop can deliver to them, both to 'readable' listeners and to
+on_readable handlers passed to register_fd.
+
+Usage: bench_dispatch.py [fds] [rounds]
+"""
+
+import socket
+import sys
+import time
+
+import thor.loop
+
+
+class Readable(thor.loop.EventSource):
+    "A socket that always has data waiting."
+
+    def __init__(self, loop, direct):
+        thor.loop.EventSource.__init__(self, loop)
+        self.count = 0
+        self.sock, self.peer = socket.socketpair()
+        self.peer.send(b'x')
+        if direct:
+            self.register_fd(self.sock.fileno(), 'readable',
+                             on_readable=self.handle_read)
+        else:
+            self.on('readable', self.handle_read)
+            self.register_fd(self.sock.fileno(), 'readable')
+
+    def handle_read(self):
+        self.count += 1
+
+    def close(self):
+        self.unregister_fd()
+        self.sock.close()
+        self.peer.close()
+
+
+def bench(fds, rounds, direct):
+    loop = thor.loop.make()
+    sources = [Readable(loop, direct) for i in range(fds)]
+    loop._run_fd_events() # apply registrations
+    start = time.perf_counter()
+    for i in range(rounds):
+        loop._run_fd_events()
+    elapsed = time.perf_counter() - start
+    events = sum([s.count for s in sources])
+    for source in sources:
+        source.close()
+    return events / elapsed
+
+
+def main(fds, rounds):
+    print("%s, %d readable fds, %d polls:" % (
+        thor.loop.make().__class__.__name__, fds, rounds))
+    for name, direct in [('emit', False), ('direct', True)]:
+        print("  %-6s %10.0f events/sec" % (name, bench(fds, rounds, direct)))
+
+
+if __name__ == "__main__":
+    fds = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    main(fds, rounds)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+TCP echo benchmark
+
+Runs an echo server on a thor loop, with a client in a separate process
+that keeps a number of connections busy sending messages and waiting for
+them to come back. Reports messages per second, and the number of system
+calls the server made per message.
+
+--asyncio runs the server on thor.loop.AsyncioLoop, and --uvloop on
+AsyncioLoop with uvloop (if installed), for comparison.
+
+Usage: bench_echo.py [--edge|--asyncio|--uvloop] [conns] [msgs] [size]
+"""
+
+import socket
+import subprocess
+import sys
+import time
+
+import thor.loop
+from thor.tcp import TcpServer
+
+
+class CountingProxy(object):
+    "Count calls to the named methods of obj."
+    def __init__(self, obj, counts, names):
+        self._obj = obj
+        for name in names:
+            setattr(self, name, self._counted(name, counts))
+
+    def _counted(self, name, counts):
+        method = getattr(self._obj, name)
+        def counted(*args):
+            counts[name] = counts.get(name, 0) + 1
+            return method(*args)
+        return counted
+
+    def __getattr__(self, name):
+        return getattr(self._obj, name)
+
+
+def run_client(port, conns, msgs, size):
+    socks = [socket.create_connection(('127.0.0.1', port))
+             for i in range(conns)]
+    msg = b'x' * size
+    for i in range(msgs):
+        for sock in socks:
+            sock.sendall(msg)
+        for sock in socks:
+            got = 0
+            while got < size:
+                got += len(sock.recv(size - got))
+    for sock in socks:
+        sock.close()
+
+
+def make_loop(backend):
+    if backend == 'asyncio':
+        return thor.loop.AsyncioLoop()
+    elif backend == 'uvloop':
+        import uvloop
+        return thor.loop.AsyncioLoop(aio_loop=uvloop.new_event_loop())
+    return thor.loop.make(edge_triggered=backend == 'edge-triggered')
+
+
+def run_server(backend, conns, msgs, size):
+    loop = make_loop(backend)
+    counts = {}
+    if hasattr(loop, '_epoll'):
+        loop._epoll = CountingProxy(loop._epoll, counts,
+            ['register', 'modify', 'unregister', 'poll'])
+    server = TcpServer('127.0.0.1', 0, loop=loop)
+    port = server.sock.getsockname()[1]
+    state = {'closed': 0}
+
+    def handle_conn(conn):
+        conn.socket = CountingProxy(conn.socket, counts, ['recv', 'send'])
+        conn.on('data', conn.write)
+        def closed():
+            state['closed'] += 1
+            if state['closed'] == conns:
+                loop.stop()
+        conn.on('close', closed)
+        conn.pause(False)
+    server.on('connect', handle_conn)
+
+    client = subprocess.Popen([sys.executable, __file__, '--client',
+        str(port), str(conns), str(msgs), str(size)])
+    start = time.perf_counter()
+    loop.run()
+    elapsed = time.perf_counter() - start
+    client.wait()
+    counts['(event mask changes)'] = loop.fd_mask_changes
+    return conns * msgs / elapsed, counts
+
+
+def main(args):
+    backend = 'level-triggered'
+    for flag, name in [('--edge', 'edge-triggered'), ('--asyncio', 'asyncio'),
+                       ('--uvloop', 'uvloop')]:
+        if flag in args:
+            backend = name
+    args = [int(a) for a in args if not a.startswith('--')]
+    conns, msgs, size = (args + [50, 2000, 64][len(args):])[:3]
+    rate, counts = run_server(backend, conns, msgs, size)
+    total = conns * msgs
+    print("%s: %d conns, %d msgs of %d bytes: %.0f msgs/sec" % (
+        backend, conns, total, size, rate))
+    changes = counts.pop('(event mask changes)')
+    print("syscalls per msg: %s; total %.2f" % (
+        ", ".join(["%s %.2f" % (name, count / total)
+                   for name, count in sorted(counts.items())]),
+        sum(counts.values()) / total))
+    print("event mask changes per msg: %.2f, syscalls saved: %d" % (
+        changes / total, changes - counts.get('modify', 0)))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--client']:
+        run_client(*[int(a) for a in sys.argv[2:6]])
+    else:
+        main(sys.argv[1:])
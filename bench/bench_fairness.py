@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Fairness benchmark
+
+Runs an HTTP server on an edge-triggered thor loop, with one greedy client
+that pipelines large batches of requests, and a number of small clients that
+make one request at a time. Reports the small clients' latency, with the
+per-iteration read and parsing budgets (TcpConnection.read_budget and
+HttpServer.input_budget) turned off, and on.
+
+Usage: bench_fairness.py [conns] [reqs] [batch]
+"""
+
+import subprocess
+import socket
+import sys
+import time
+
+import thor.loop
+from thor.events import on
+from thor.http.server import HttpServer
+from thor.tcp import TcpConnection
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+RESPONSE_END = b"\r\n\r\nok"
+
+
+def read_responses(sock, count, data=b''):
+    "Read count responses from sock, returning any leftover data."
+    while count:
+        found = data.count(RESPONSE_END)
+        if found >= count:
+            return data.split(RESPONSE_END, count)[-1]
+        count -= found
+        data = data.rsplit(RESPONSE_END, 1)[-1] if found else data
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise IOError("server closed the connection")
+        data += chunk
+    return data
+
+
+def run_greedy(port, batch):
+    sock = socket.create_connection(('127.0.0.1', port))
+    data = b''
+    while True:
+        sock.sendall(REQUEST * batch)
+        data = read_responses(sock, batch, data)
+
+
+def run_small(port, conns, reqs):
+    socks = [socket.create_connection(('127.0.0.1', port))
+             for i in range(conns)]
+    latencies = []
+    for i in range(reqs):
+        for sock in socks:
+            start = time.perf_counter()
+            sock.sendall(REQUEST)
+            read_responses(sock, 1)
+            latencies.append(time.perf_counter() - start)
+    for sock in socks:
+        sock.close()
+    print(" ".join(["%.6f" % l for l in latencies]))
+
+
+def serve(port, conns, reqs, batch):
+    loop = thor.loop.make(edge_triggered=True)
+    server = HttpServer('127.0.0.1', port, loop=loop)
+    @on(server)
+    def exchange(x):
+        @on(x)
+        def request_done(trailers):
+            x.response_start(200, "OK", [("Content-Length", "2")])
+            x.response_body("ok")
+            x.response_done([])
+    args = [sys.executable, __file__]
+    greedy = subprocess.Popen(args + ['--greedy', str(port), str(batch)])
+    time.sleep(0.2) # let it get going
+    small = subprocess.Popen(args + ['--small', str(port), str(conns),
+                                     str(reqs)], stdout=subprocess.PIPE)
+    def check():
+        if small.poll() is None:
+            loop.schedule(0.1, check)
+        else:
+            loop.stop()
+    loop.schedule(0.1, check)
+    loop.run()
+    greedy.kill()
+    greedy.wait()
+    server.shutdown()
+    latencies = sorted([float(l) for l in small.stdout.read().split()])
+    return latencies
+
+
+def main(conns, reqs, batch):
+    # without a budget, the parser recurses once per pipelined request.
+    sys.setrecursionlimit(100000)
+    print("1 greedy client pipelining %d requests, %d small clients x %d "
+          "requests:" % (batch, conns, reqs))
+    budgets = (TcpConnection.read_budget, HttpServer.input_budget)
+    for name, (read_budget, input_budget) in [
+      ('no budget', (None, None)),
+      ('budget', budgets)]:
+        TcpConnection.read_budget = read_budget
+        HttpServer.input_budget = input_budget
+        latencies = serve(8400 + bool(input_budget), conns, reqs, batch)
+        print("  %-10s p50 %7.2fms  p99 %7.2fms  max %7.2fms" % (
+            name, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * .99)] * 1000,
+            latencies[-1] * 1000))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--greedy']:
+        try:
+            run_greedy(*[int(arg) for arg in sys.argv[2:4]])
+        except IOError:
+            pass
+        sys.exit(0)
+    if sys.argv[1:2] == ['--small']:
+        run_small(*[int(arg) for arg in sys.argv[2:5]])
+        sys.exit(0)
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [10, 50, 2000]
+    main(*(args + defaults[len(args):]))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Keep-alive HTTP benchmark
+
+Runs an HTTP server that answers each request with a chunked response
+(written as a header block, a body chunk and the last chunk), with clients
+in a separate process that keep a number of connections busy sending a
+request and waiting for the response. Reports requests per second, and the
+number of system calls the server made per request, for each of
+TcpConnection's write policies, and with HttpServer.cork_responses.
+
+Usage: bench_http.py [--edge] [conns] [reqs]
+"""
+
+import socket
+import subprocess
+import sys
+import time
+
+import thor.loop
+from thor.events import on
+from thor.http.server import HttpServer
+
+from bench_echo import CountingProxy
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+RESPONSE_END = b"ok\r\n0\r\n\r\n"
+
+# name: (write_policy, cork_responses)
+POLICIES = [
+    ('poll', ('poll', False)),
+    ('immediate', ('immediate', False)),
+    ('iteration', ('iteration', False)),
+    ('corked+immediate', ('immediate', True)),
+]
+
+
+def run_client(port, conns, reqs):
+    socks = [socket.create_connection(('127.0.0.1', port))
+             for i in range(conns)]
+    for i in range(reqs):
+        for sock in socks:
+            sock.sendall(REQUEST)
+        for sock in socks:
+            data = b''
+            while not data.endswith(RESPONSE_END):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise IOError("server closed the connection")
+                data += chunk
+    for sock in socks:
+        sock.close()
+
+
+def run_server(edge, policy, cork, conns, reqs):
+    loop = thor.loop.make(edge_triggered=edge)
+    counts = {}
+    if hasattr(loop, '_epoll'):
+        loop._epoll = CountingProxy(loop._epoll, counts,
+            ['register', 'modify', 'unregister', 'poll'])
+    server = HttpServer('127.0.0.1', 0, loop=loop)
+    server.cork_responses = cork
+    port = server.tcp_server.sock.getsockname()[1]
+    state = {'closed': 0}
+
+    @on(server.tcp_server)
+    def connect(conn):
+        conn.write_policy = policy
+        conn.socket = CountingProxy(conn.socket, counts,
+            ['recv', 'recv_into', 'send', 'sendmsg'])
+        def closed():
+            state['closed'] += 1
+            if state['closed'] == conns:
+                loop.stop()
+        conn.on('close', closed)
+
+    @on(server)
+    def exchange(x):
+        @on(x)
+        def request_done(trailers):
+            x.response_start(200, "OK", [])
+            x.response_body("ok")
+            x.response_done([])
+
+    client = subprocess.Popen([sys.executable, __file__, '--client',
+        str(port), str(conns), str(reqs)])
+    start = time.perf_counter()
+    loop.run()
+    elapsed = time.perf_counter() - start
+    client.wait()
+    server.shutdown()
+    return conns * reqs / elapsed, counts
+
+
+def main(args):
+    edge = '--edge' in args
+    args = [int(a) for a in args if not a.startswith('--')]
+    conns, reqs = (args + [50, 1000][len(args):])[:2]
+    total = conns * reqs
+    print("%s: %d conns x %d requests:" % (
+        edge and 'edge-triggered' or 'level-triggered', conns, reqs))
+    for name, (policy, cork) in POLICIES:
+        rate, counts = run_server(edge, policy, cork, conns, reqs)
+        print("  %-17s %7.0f req/sec  syscalls per req: %s; total %.2f" % (
+            name, rate,
+            ", ".join(["%s %.2f" % (call, count / total)
+                       for call, count in sorted(counts.items())]),
+            sum(counts.values()) / total))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--client']:
+        run_client(*[int(a) for a in sys.argv[2:5]])
+    else:
+        main(sys.argv[1:])
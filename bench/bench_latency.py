@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+Timer latency benchmark
+
+Measures how late scheduled events run relative to their deadline, and how
+often an idle loop wakes up.
+
+Usage: bench_latency.py [count]
+"""
+
+import random
+import sys
+import time
+
+import thor.loop
+
+
+def count_wakeups(loop):
+    "Count calls to the loop's poll."
+    loop.wakeups = 0
+    run_fd_events = loop._run_fd_events
+    def counted(*args):
+        loop.wakeups += 1
+        return run_fd_events(*args)
+    loop._run_fd_events = counted
+
+
+def bench_accuracy(count):
+    loop = thor.loop.make()
+    lateness = []
+    def fire(deadline, left):
+        lateness.append(time.perf_counter() - deadline)
+        if left:
+            next_timer(left - 1)
+        else:
+            loop.stop()
+    def next_timer(left):
+        delta = random.uniform(0.001, 0.05)
+        loop.schedule(delta, fire, time.perf_counter() + delta, left)
+    next_timer(count - 1)
+    loop.run()
+    lateness.sort()
+    return [lateness[int(len(lateness) * p)] * 1000 for p in (.5, .99)] + \
+        [lateness[-1] * 1000]
+
+
+def bench_idle(duration, pending=False):
+    loop = thor.loop.make()
+    count_wakeups(loop)
+    if pending:
+        loop.schedule(duration * 10, lambda: None)
+    loop.schedule(duration, loop.stop)
+    loop.run()
+    return loop.wakeups / duration
+
+
+def main(count):
+    p50, p99, worst = bench_accuracy(count)
+    print("timer lateness (%d timers, 1-50ms): "
+          "p50 %.2fms, p99 %.2fms, max %.2fms" % (count, p50, p99, worst))
+    print("idle wakeups/sec, nothing pending: %.1f" % bench_idle(2))
+    print("idle wakeups/sec, one timer pending: %.1f" % bench_idle(2, True))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
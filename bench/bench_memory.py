@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Memory benchmark
+
+Uses tracemalloc to measure the memory used by idle HTTP server connections
+(a TcpConnection and its HttpServerConnection, with the listeners that
+HttpServer adds), and by HTTP server and client exchanges with a listener
+each.
+
+Usage: bench_memory.py [count]
+"""
+
+import socket
+import sys
+import tracemalloc
+
+import thor.loop
+from thor.http.client import HttpClient
+from thor.http.server import HttpServer, HttpServerExchange
+from thor.tcp import TcpConnection
+
+
+def measure(make, count):
+    "Return the bytes allocated per object by calling make count times."
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [make(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    allocated = sum([stat.size_diff for stat in stats])
+    assert len(objects) == count
+    return allocated / count
+
+
+def bench(count):
+    loop = thor.loop.make()
+    server = HttpServer('127.0.0.1', 0, loop=loop)
+    # the client sides aren't measured.
+    socks = [socket.socketpair() for i in range(count)]
+
+    def idle_conn(i):
+        tcp_conn = TcpConnection(socks[i][0], '127.0.0.1', i, loop)
+        server.handle_conn(tcp_conn)
+        return tcp_conn
+    conns = []
+    conn_size = measure(lambda i: conns.append(idle_conn(i)), count)
+
+    http_conn = conns[0].listeners('data')[0].listener.__self__
+    def server_exchange(i):
+        exchange = HttpServerExchange(http_conn, 'GET', '/', [], 'HTTP/1.1')
+        exchange.on('request_done', lambda trailers: None)
+        return exchange
+    server_ex_size = measure(server_exchange, count)
+
+    client = HttpClient(loop)
+    def client_exchange(i):
+        exchange = client.exchange()
+        exchange.on('response_done', lambda trailers: None)
+        return exchange
+    client_ex_size = measure(client_exchange, count)
+
+    for conn in conns:
+        conn.close()
+    for server_sock, client_sock in socks:
+        server_sock.close()
+        client_sock.close()
+    server.shutdown()
+    return conn_size, server_ex_size, client_ex_size
+
+
+def main(count):
+    conn_size, server_ex_size, client_ex_size = bench(count)
+    print("%d of each:" % count)
+    print("  %-28s %8d bytes" % ("idle server connection", conn_size))
+    print("  %-28s %8d bytes" % ("HttpServerExchange", server_ex_size))
+    print("  %-28s %8d bytes" % ("HttpClientExchange", client_ex_size))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if sys.argv[1:] else 1000)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""
+Multi-loop scaling benchmark
+
+Runs an HTTP server on 1, 2, 4... loops in as many threads (see
+thor.loop.LoopThreads), each with its own listening socket on a shared port,
+and loads it with keep-alive clients in separate processes. Reports requests
+per second for each number of loops.
+
+Whether this scales depends on the interpreter; with a GIL, the loops take
+turns.
+
+Usage: bench_multiloop.py [max_loops] [clients] [conns] [reqs]
+"""
+
+import socket
+import subprocess
+import sys
+import time
+
+import thor.loop
+from thor.events import on
+from thor.http.server import HttpServer
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+RESPONSE_END = b"\r\n\r\nok"
+
+
+def run_client(port, conns, reqs):
+    socks = [socket.create_connection(('127.0.0.1', port))
+             for i in range(conns)]
+    for i in range(reqs):
+        for sock in socks:
+            sock.sendall(REQUEST)
+        for sock in socks:
+            data = b''
+            while not data.endswith(RESPONSE_END):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise IOError("server closed the connection")
+                data += chunk
+    for sock in socks:
+        sock.close()
+
+
+def serve(loop, port):
+    server = HttpServer('127.0.0.1', port, loop=loop, reuse_port=True)
+    @on(server)
+    def exchange(x):
+        @on(x)
+        def request_done(trailers):
+            x.response_start(200, "OK", [("Content-Length", "2")])
+            x.response_body("ok")
+            x.response_done([])
+    loop.on('stop', server.shutdown)
+
+
+def bench(loops, port, clients, conns, reqs):
+    threads = thor.loop.LoopThreads(loops, lambda loop: serve(loop, port))
+    threads.start()
+    time.sleep(0.2) # let the servers start listening
+    start = time.perf_counter()
+    procs = [subprocess.Popen([sys.executable, __file__, '--client',
+                               str(port), str(conns), str(reqs)])
+             for i in range(clients)]
+    for proc in procs:
+        proc.wait()
+    elapsed = time.perf_counter() - start
+    threads.stop()
+    threads.join()
+    return clients * conns * reqs / elapsed
+
+
+def main(max_loops, clients, conns, reqs):
+    print("%d client processes x %d conns x %d requests:" % (
+        clients, conns, reqs))
+    loops = 1
+    while loops <= max_loops:
+        rps = bench(loops, 8300 + loops, clients, conns, reqs)
+        print("  %2d loops: %8.0f requests/sec" % (loops, rps))
+        loops *= 2
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--client']:
+        run_client(*[int(arg) for arg in sys.argv[2:5]])
+        sys.exit(0)
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [4, 2, 20, 500]
+    main(*(args + defaults[len(args):]))
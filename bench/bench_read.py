@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Bulk read benchmark
+
+Runs a thor server that reads everything sent to it, with a client in a
+separate process that sends a number of megabytes over a number of
+connections. Reports throughput with a plain 'data' listener (which gets
+a new bytes object per read) and with a BufferListener (which gets
+memoryviews of the loop's read buffer).
+
+Usage: bench_read.py [conns] [megabytes]
+"""
+
+import socket
+import subprocess
+import sys
+import time
+
+import thor.loop
+from thor.tcp import TcpServer, BufferListener
+
+
+def run_client(port, conns, megabytes):
+    socks = [socket.create_connection(('127.0.0.1', port))
+             for i in range(conns)]
+    chunk = b'x' * 65536
+    for i in range(megabytes * 16):
+        for sock in socks:
+            sock.sendall(chunk)
+    for sock in socks:
+        sock.close()
+
+
+def run_server(buffered, conns, megabytes):
+    loop = thor.loop.make(edge_triggered=True)
+    server = TcpServer('127.0.0.1', 0, loop=loop)
+    port = server.sock.getsockname()[1]
+    state = {'closed': 0, 'bytes': 0, 'reads': 0}
+
+    def count(data):
+        state['bytes'] += len(data)
+        state['reads'] += 1
+
+    def handle_conn(conn):
+        conn.on('data', BufferListener(count) if buffered else count)
+        def closed():
+            state['closed'] += 1
+            if state['closed'] == conns:
+                loop.stop()
+        conn.on('close', closed)
+        conn.pause(False)
+    server.on('connect', handle_conn)
+
+    client = subprocess.Popen([sys.executable, __file__, '--client',
+        str(port), str(conns), str(megabytes)])
+    start = time.perf_counter()
+    loop.run()
+    elapsed = time.perf_counter() - start
+    client.wait()
+    server.shutdown()
+    return state['bytes'] / elapsed / 2 ** 20, state['reads']
+
+
+def main(conns, megabytes):
+    print("%d conns x %d MB:" % (conns, megabytes))
+    for name, buffered in [('bytes', False), ('BufferListener', True)]:
+        rate, reads = run_server(buffered, conns, megabytes)
+        print("  %-16s %8.1f MB/s  %8d reads" % (name, rate, reads))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--client']:
+        run_client(*[int(a) for a in sys.argv[2:5]])
+    else:
+        args = [int(a) for a in sys.argv[1:]]
+        main(*(args + [10, 100][len(args):]))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""
+Static file benchmark
+
+Runs an HTTP server that serves a file of a number of megabytes, with
+clients in a separate process that fetch it a number of times over a
+keep-alive connection each. Reports throughput and server CPU time when the
+file is read and sent with response_body, and when it's sent with
+response_file.
+
+Usage: bench_sendfile.py [conns] [fetches] [megabytes]
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import thor.loop
+from thor.events import on
+from thor.http.server import HttpServer
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+def run_client(port, conns, fetches, megabytes):
+    socks = [socket.create_connection(('127.0.0.1', port))
+             for i in range(conns)]
+    for i in range(fetches):
+        for sock in socks:
+            sock.sendall(REQUEST)
+        for sock in socks:
+            data = b''
+            while b'\r\n\r\n' not in data:
+                data += sock.recv(4096)
+            left = megabytes * 2 ** 20 - len(data.split(b'\r\n\r\n', 1)[1])
+            while left:
+                left -= len(sock.recv(min(left, 65536)))
+    for sock in socks:
+        sock.close()
+
+
+def run_server(use_sendfile, path, conns, fetches, megabytes):
+    loop = thor.loop.make(edge_triggered=True)
+    server = HttpServer('127.0.0.1', 0, loop=loop)
+    port = server.tcp_server.sock.getsockname()[1]
+    size = os.path.getsize(path)
+    state = {'closed': 0}
+
+    @on(server.tcp_server)
+    def connect(conn):
+        def closed():
+            state['closed'] += 1
+            if state['closed'] == conns:
+                loop.stop()
+        conn.on('close', closed)
+
+    @on(server)
+    def exchange(x):
+        @on(x)
+        def request_done(trailers):
+            x.response_start(200, "OK", [("Content-Length", str(size))])
+            if use_sendfile:
+                # closed when it's garbage collected, once it's sent.
+                x.response_file(open(path, 'rb'))
+            else:
+                with open(path, 'rb') as fh:
+                    x.response_body(fh.read())
+            x.response_done([])
+
+    client = subprocess.Popen([sys.executable, __file__, '--client',
+        str(port), str(conns), str(fetches), str(megabytes)])
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    loop.run()
+    cpu = time.process_time() - cpu_start
+    elapsed = time.perf_counter() - start
+    client.wait()
+    server.shutdown()
+    return conns * fetches * megabytes / elapsed, cpu
+
+
+def main(conns, fetches, megabytes):
+    with tempfile.NamedTemporaryFile() as fh:
+        fh.write(b'x' * megabytes * 2 ** 20)
+        fh.flush()
+        print("%d conns x %d fetches of %d MB:" % (conns, fetches, megabytes))
+        for name, use_sendfile in [('response_body', False),
+                                   ('response_file', True)]:
+            rate, cpu = run_server(use_sendfile, fh.name, conns, fetches,
+                                   megabytes)
+            print("  %-14s %8.1f MB/s  server CPU %.2fs" % (name, rate, cpu))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--client']:
+        run_client(*[int(a) for a in sys.argv[2:6]])
+    else:
+        args = [int(a) for a in sys.argv[1:]]
+        main(*(args + [4, 20, 16][len(args):]))
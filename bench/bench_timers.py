@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Timer queue benchmark
+
+Measures the cost of scheduling, deleting and running scheduled events on a
+loop with a large number of them pending, and of adding and deleting
+timeouts.
+
+Usage: bench_timers.py [count ...]
+"""
+
+import random
+import sys
+import time
+
+import thor.loop
+
+
+def bench(count):
+    loop = thor.loop.make()
+    nop = lambda: None
+    # deadlines in the past, in random order, so that they're all due.
+    deltas = [-random.random() for i in range(count)]
+
+    start = time.perf_counter()
+    timers = [loop.schedule(delta, nop) for delta in deltas]
+    sched_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for timer in timers[::2]:
+        timer.delete()
+    del_time = time.perf_counter() - start
+    pending = loop.timer_count()
+
+    start = time.perf_counter()
+    loop._run_timers()
+    run_time = time.perf_counter() - start
+
+    assert loop.timer_count() == 0
+    return sched_time, del_time, run_time, pending
+
+
+def bench_timeouts(count):
+    loop = thor.loop.make()
+    nop = lambda: None
+    deltas = [random.random() * 120 for i in range(count)]
+
+    start = time.perf_counter()
+    timers = [loop.schedule_timeout(delta, nop) for delta in deltas]
+    sched_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for timer in timers:
+        timer.delete()
+    del_time = time.perf_counter() - start
+
+    assert loop.timer_count() == 0
+    return sched_time, del_time
+
+
+def main(counts):
+    print("%10s %14s %14s %14s" % (
+        "timers", "schedule/op", "delete/op", "run/op"))
+    for count in counts:
+        sched_time, del_time, run_time, pending = bench(count)
+        print("%10d %12.2fus %12.2fus %12.2fus" % (
+            count,
+            sched_time / count * 1e6,
+            del_time / (count - pending) * 1e6,
+            run_time / pending * 1e6
+        ))
+    print()
+    print("%10s %14s %14s" % ("timeouts", "schedule/op", "delete/op"))
+    for count in counts:
+        sched_time, del_time = bench_timeouts(count)
+        print("%10d %12.2fus %12.2fus" % (
+            count, sched_time / count * 1e6, del_time / count * 1e6))
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10 ** 5, 10 ** 6])
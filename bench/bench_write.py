@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Buffered write benchmark
+
+Runs a thor server that writes a number of megabytes to each connection in
+one go, so that they're buffered, with a client in a separate process that
+reads them slowly, a little at a time. Reports how long it took, and the
+CPU time that the server used to flush its write buffers.
+
+Usage: bench_write.py [--edge] [conns] [megabytes] [chunk size]
+"""
+
+import socket
+import subprocess
+import sys
+import time
+
+import thor.loop
+from thor.tcp import TcpServer
+
+
+def run_client(port, conns, megabytes, readsize=4096):
+    socks = [socket.create_connection(('127.0.0.1', port))
+             for i in range(conns)]
+    left = dict([(sock, megabytes * 2 ** 20) for sock in socks])
+    while left:
+        for sock in list(left.keys()):
+            left[sock] -= len(sock.recv(min(readsize, left[sock])))
+            if left[sock] == 0:
+                sock.close()
+                del left[sock]
+
+
+def run_server(edge, conns, megabytes, size):
+    loop = thor.loop.make(edge_triggered=edge)
+    server = TcpServer('127.0.0.1', 0, loop=loop)
+    port = server.sock.getsockname()[1]
+    server_conns = []
+    chunk = b'x' * size
+
+    def handle_conn(conn):
+        for i in range(megabytes * 2 ** 20 // size):
+            conn.write(chunk)
+        conn.close() # once it's flushed
+        server_conns.append(conn)
+    server.on('connect', handle_conn)
+
+    def check():
+        if len(server_conns) == conns and \
+          not any([conn.tcp_connected for conn in server_conns]):
+            loop.stop()
+        else:
+            loop.schedule(0.01, check)
+    check()
+
+    client = subprocess.Popen([sys.executable, __file__, '--client',
+        str(port), str(conns), str(megabytes)])
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    loop.run()
+    cpu = time.process_time() - cpu_start
+    elapsed = time.perf_counter() - start
+    client.wait()
+    server.shutdown()
+    return elapsed, cpu
+
+
+def main(args):
+    edge = '--edge' in args
+    args = [int(a) for a in args if not a.startswith('--')]
+    conns, megabytes, size = (args + [1, 100, 16384][len(args):])[:3]
+    elapsed, cpu = run_server(edge, conns, megabytes, size)
+    print("%s: %d conns x %d MB in %d byte writes: %.2fs, server CPU %.2fs" % (
+        edge and 'edge-triggered' or 'level-triggered', conns, megabytes,
+        size, elapsed, cpu))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--client']:
+        run_client(*[int(a) for a in sys.argv[2:5]])
+    else:
+        main(sys.argv[1:])
@@ -137,6 +137,50 @@ class TestEventEmitter(unittest.TestCase):
         self.assertEquals(self.t.rem2_count, 0)
         self.t.emit('rem2')
         self.assertEquals(self.t.rem2_count, 1)
+
+    def test_single_listener(self):
+        e = EventEmitter()
+        self.assertEquals(e.events(), [])
+        self.assertEquals(e.listeners('foo'), [])
+        e.on('foo', self.t.handle_foo)
+        self.assertEquals(e.listeners('foo'), [self.t.handle_foo])
+        e.emit('foo')
+        self.assertEquals(self.t.foo_count, 1)
+        e.removeListener('foo', self.t.handle_foo)
+        self.assertEquals(e.events(), [])
+        e.emit('foo')
+        self.assertEquals(self.t.foo_count, 1)
+
+    def test_newListener(self):
+        added = []
+        self.t.on('newListener', lambda event, listener: added.append(event))
+        self.t.on('foo', self.t.handle_foo)
+        self.assertEquals(added, ['newListener', 'foo'])
+
+    def test_weak(self):
+        class Listener(object):
+            def __init__(self):
+                self.count = 0
+            def handle(self):
+                self.count += 1
+        e = EventEmitter()
+        l1, l2 = Listener(), Listener()
+        e.on('foo', l1.handle, weak=True)
+        e.on('foo', l2.handle, weak=True)
+        e.emit('foo')
+        self.assertEquals((l1.count, l2.count), (1, 1))
+        e.removeListener('foo', l2.handle)
+        del l1
+        e.emit('foo')
+        self.assertEquals(l2.count, 1)
+        e.on('foo', Listener().handle, weak=True) # drops the dead ones
+        self.assertEquals(len(e.listeners('foo')), 1)
+
+    def test_weak_once(self):
+        self.t.once('qux', self.t.handle_foo, weak=True)
+        self.t.emit('qux')
+        self.t.emit('qux')
+        self.assertEquals(self.t.foo_count, 1)
             
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -480,6 +480,27 @@ Content-Length: %(body_len)s
 
 %(body)s"""], body, 2)
 
+    def test_pipeline_budget(self):
+        body = "abc123def456ghi789"
+        msg = """\
+HTTP/1.1 200 OK
+Content-Type: text/plain
+Content-Length: %(body_len)s
+
+%(body)s"""
+        deferred = []
+        self.parser.input_budget = 2
+        self.parser.input_defer = lambda: deferred.append(True)
+        self.checkMultiMsg([msg * 5], body, 2)
+        self.assertEqual(len(deferred), 1)
+        self.checkMultiMsg([msg], body, 2) # waits its turn
+        self.parser._input_resume()
+        self.checkMultiMsg([], body, 4)
+        self.assertEqual(len(deferred), 2)
+        self.parser._input_resume()
+        self.checkMultiMsg([], body, 6)
+        self.assertEqual(len(deferred), 2)
+
 # TODO:
 #    def test_nobody_delimit(self):
 #    def test_pipeline_nobody(self):
@@ -2,6 +2,8 @@
 
 import socket
 import sys
+import tempfile
+import threading
 import time
 import unittest
 
@@ -155,6 +157,87 @@ Content-Length: 5
         self.go([server_side], [client_side])        
 
 
+    def test_pipeline_budget(self):
+        requests = 5000
+        self.served = 0
+        self.max_buffered = 0
+        def server_side(server):
+            server.input_budget = 4
+            @on(server.tcp_server)
+            def connect(tcp_conn):
+                http_conn = tcp_conn.listeners('data')[0].listener.__self__
+                def check_buffer(data):
+                    self.max_buffered = max(self.max_buffered,
+                        len(http_conn._input_buffer))
+                tcp_conn.on('data', check_buffer)
+            @on(server)
+            def exchange(x):
+                @on(x)
+                def request_done(trailers):
+                    http_conn = x.http_conn
+                    if http_conn._input_deferred:
+                        # the rest is left in the kernel until we resume.
+                        self.assertTrue(http_conn.tcp_conn._input_paused)
+                    x.response_start(200, "OK", [("Content-Length", "2")])
+                    x.response_body(b"ok")
+                    x.response_done([])
+                    self.served += 1
+                    if self.served == requests:
+                        self.loop.stop()
+
+        def client_side(client_conn):
+            def read():
+                while client_conn.recv(65536):
+                    pass
+            reader = threading.Thread(target=read)
+            reader.daemon = True
+            reader.start()
+            client_conn.sendall(b"GET / HTTP/1.1\r\nHost: a\r\n\r\n"
+                                * requests)
+            time.sleep(3)
+        self.go([server_side], [client_side])
+        self.assertEqual(self.served, requests)
+        # no more than about a read's worth is buffered by the parser.
+        self.assertTrue(self.max_buffered < 1024 * 32, self.max_buffered)
+
+    def test_response_file(self):
+        body = b'0123456789' * 100000
+        fh = tempfile.TemporaryFile()
+        fh.write(body)
+        fh.flush()
+        self.client_recv = b''
+        def server_side(server):
+            @on(server)
+            def exchange(x):
+                @on(x)
+                def request_done(trailers):
+                    if x.uri == '/chunked':
+                        x.response_start(200, "OK", [])
+                        x.response_body(b'<')
+                        x.response_file(fh, 10, 100)
+                        x.response_body(b'>')
+                    else:
+                        x.response_start(200, "OK",
+                            [("Content-Length", str(len(body)))])
+                        x.response_file(fh)
+                    x.response_done([])
+
+        def client_side(client_conn):
+            client_conn.sendall(b"GET / HTTP/1.1\r\nHost: a\r\n\r\n"
+                                b"GET /chunked HTTP/1.1\r\nHost: a\r\n\r\n")
+            while not self.client_recv.endswith(b"0\r\n\r\n"):
+                data = client_conn.recv(65536)
+                if not data:
+                    break
+                self.client_recv += data
+            self.loop.call_threadsafe(self.loop.stop)
+        self.go([server_side], [client_side])
+        fh.close()
+        first, second = self.client_recv.split(b'\r\n\r\n', 1)
+        self.assertTrue(second.startswith(body))
+        self.assertTrue(second[len(body):].endswith(
+            b"1\r\n<\r\n64\r\n" + body[10:110] + b"\r\n1\r\n>\r\n0\r\n\r\n"))
+
 #    def test_pipeline(self):
 #        def server_side(server):
 #            server.ex_count = 0
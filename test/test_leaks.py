@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import gc
+import socket
+import unittest
+
+import thor.loop
+from thor.events import on
+from thor.http import HttpClient, HttpServer
+
+
+def live_objects():
+    "Return a dict of Thor classes and how many of them are alive."
+    gc.collect()
+    counts = {}
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls.__module__.startswith('thor'):
+            counts[cls.__name__] = counts.get(cls.__name__, 0) + 1
+    return counts
+
+
+class TestLeaks(unittest.TestCase):
+    exchanges = 100000
+
+    def setUp(self):
+        self.loop = thor.loop.make()
+        self.server = HttpServer('127.0.0.1', 0, loop=self.loop)
+        self.port = self.server.tcp_server.sock.getsockname()[1]
+        @on(self.server)
+        def exchange(x):
+            @on(x)
+            def request_done(trailers):
+                x.response_start(200, "OK", [("Content-Length", "2")])
+                x.response_body("ok")
+                x.response_done([])
+
+    def tearDown(self):
+        self.server.shutdown()
+        if self.loop.running:
+            self.loop.stop()
+
+    def check_bounded(self, make_client):
+        "Run self.exchanges exchanges, checking that objects don't pile up."
+        done = [0]
+        counts = {}
+        def go():
+            exchange = make_client().exchange()
+            exchange.on('response_done', finished)
+            exchange.request_start(
+                "GET", "http://127.0.0.1:%s/" % self.port, [])
+            exchange.request_done([])
+        def finished(trailers):
+            done[0] += 1
+            if done[0] == 1000:
+                counts.update(live_objects())
+            if done[0] == self.exchanges:
+                self.loop.stop()
+            else:
+                self.loop.call_soon(go)
+        go()
+        self.loop.schedule(300, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(done[0], self.exchanges)
+        after = live_objects()
+        for name, count in after.items():
+            self.assertTrue(count <= counts.get(name, 0) + 10,
+                "%s: %s, was %s" % (name, count, counts.get(name, 0)))
+
+    def test_exchanges(self):
+        client = HttpClient(self.loop)
+        self.check_bounded(lambda: client)
+
+    def test_clients(self):
+        def make_client():
+            client = HttpClient(self.loop)
+            client.idle_timeout = 0 # so connections aren't pooled
+            return client
+        self.exchanges = 2000 # each one uses a new connection
+        self.check_bounded(make_client)
+
+    def test_idle_timeout_busy(self):
+        "Pooled connections expire even if the loop never goes idle."
+        client = HttpClient(self.loop)
+        client.idle_timeout = 0.2
+        pooled = []
+        busy_sock, other_sock = socket.socketpair()
+        other_sock.send(b'x') # stays readable, so every poll has events
+        busy = thor.loop.EventSource(self.loop)
+        busy.register_fd(busy_sock.fileno(), 'readable',
+                         on_readable=lambda: None)
+        def finished(trailers):
+            pooled.extend(sum(client._idle_conns.values(), []))
+        exchange = client.exchange()
+        exchange.on('response_done', finished)
+        exchange.request_start("GET", "http://127.0.0.1:%s/" % self.port, [])
+        exchange.request_done([])
+        connected = []
+        def check():
+            connected.extend([conn.tcp_connected for conn in pooled])
+            self.loop.stop() # which closes pooled connections anyway
+        self.loop.schedule(1, check)
+        self.loop.run()
+        busy_sock.close()
+        other_sock.close()
+        self.assertEqual(connected, [False])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ import os
 import socket
 import sys
 import tempfile
+import threading
 import time as systime
 import unittest
 
@@ -92,6 +93,231 @@ class TestLoop(unittest.TestCase):
         self.loop.schedule(run_time, check_time, systime.time())
         self.loop.run()
         
+    def test_schedule_short(self):
+        def check_time(start_time):
+            late = systime.time() - start_time - 0.05
+            self.assertTrue(0 <= late < 0.02, "late: %s" % late)
+            self.loop.stop()
+        self.loop.schedule(0.05, check_time, systime.time())
+        self.loop.run()
+
+    def test_idle_wakeups(self):
+        polls = []
+        run_fd_events = self.loop._run_fd_events
+        def counted(timeout):
+            polls.append(timeout)
+            run_fd_events(timeout)
+        self.loop._run_fd_events = counted
+        self.loop.schedule(1, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(len(polls), 1)
+
+    def test_idle_wakeups_timeout(self):
+        polls = []
+        run_fd_events = self.loop._run_fd_events
+        def counted(timeout):
+            polls.append(timeout)
+            run_fd_events(timeout)
+        self.loop._run_fd_events = counted
+        # e.g., an idle pooled connection; it shouldn't wake us every tick.
+        self.loop.schedule_timeout(60, self.fail, "too soon")
+        self.loop.schedule(1, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(len(polls), 1)
+
+    def test_call_soon(self):
+        fired = []
+        def first():
+            fired.append('first')
+            self.loop.call_soon(fired.append, 'next iteration')
+        self.loop.schedule(0, fired.append, 'scheduled')
+        self.loop.call_soon(first)
+        self.loop.call_soon(fired.append, 'second')
+        self.loop.call_soon(fired.append, 'deleted').delete()
+        self.loop.schedule(0.5, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(fired,
+            ['first', 'second', 'scheduled', 'next iteration'])
+
+    def test_call_idle(self):
+        fired = []
+        busy_sock, other_sock = socket.socketpair()
+        other_sock.send(b'x') # stays readable until we stop listening
+        busy = thor.loop.EventSource(self.loop)
+        def handle_read():
+            fired.append('busy')
+            if len(fired) == 10:
+                busy.unregister_fd()
+        busy.register_fd(busy_sock.fileno(), 'readable',
+                         on_readable=handle_read)
+        self.loop.call_idle(fired.append, 'idle')
+        self.loop.call_idle(fired.append, 'deleted').delete()
+        self.loop.schedule(0.5, self.loop.stop)
+        self.loop.run()
+        busy_sock.close()
+        other_sock.close()
+        self.assertEqual(fired, ['busy'] * 10 + ['idle'])
+
+    def test_call_idle_slice(self):
+        fired = []
+        busy_sock, other_sock = socket.socketpair()
+        other_sock.send(b'x')
+        busy = thor.loop.EventSource(self.loop)
+        def handle_read():
+            fired.append('busy')
+        busy.register_fd(busy_sock.fileno(), 'readable',
+                         on_readable=handle_read)
+        self.loop.idle_slice = 0.01
+        self.loop.call_idle(fired.append, 'idle')
+        self.loop.schedule(0.5, self.loop.stop)
+        self.loop.run()
+        busy_sock.close()
+        other_sock.close()
+        self.assertTrue('idle' in fired[:3])
+
+    def test_call_before_poll(self):
+        fired = []
+        def first():
+            fired.append('soon')
+            self.loop.call_before_poll(fired.append, 'before poll')
+            self.loop.call_soon(fired.append, 'next soon')
+            self.loop.call_before_poll(fired.append, 'deleted').delete()
+        self.loop.call_soon(first)
+        self.loop.schedule(0.1, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(fired, ['soon', 'before poll', 'next soon'])
+
+    def test_call_soon_latency(self):
+        def check_time(start_time):
+            self.assertTrue(systime.time() - start_time < 0.01)
+            self.loop.stop()
+        self.loop.schedule(5, self.loop.stop)
+        self.loop.call_soon(check_time, systime.time())
+        self.loop.run()
+
+    def test_call_threadsafe(self):
+        fired = []
+        def check_thread(name):
+            fired.append(name)
+            self.assertEqual(threading.current_thread().name, 'MainThread')
+            if len(fired) == 2:
+                self.loop.stop()
+        def other_thread():
+            systime.sleep(0.1)
+            self.loop.call_threadsafe(check_thread, 'first')
+            self.loop.call_threadsafe(check_thread, 'second')
+        threading.Thread(target=other_thread).start()
+        self.loop.schedule(5, self.fail, "loop wasn't woken.")
+        start = systime.time()
+        self.loop.run()
+        self.assertEqual(fired, ['first', 'second'])
+        self.assertTrue(systime.time() - start < 1)
+
+    def test_call_threadsafe_threads(self):
+        threads, calls = 4, 5000
+        fired = [0]
+        def count():
+            fired[0] += 1
+            if fired[0] == threads * calls:
+                self.loop.stop()
+        def other_thread():
+            for i in range(calls):
+                self.loop.call_threadsafe(count)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6) # make wakeups race with the loop
+        self.addCleanup(sys.setswitchinterval, interval)
+        self.loop.call_soon(lambda: [
+            threading.Thread(target=other_thread).start()
+            for i in range(threads)])
+        self.loop.schedule(10, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(fired[0], threads * calls)
+
+    def test_waker_race(self):
+        waker = self.loop._get_waker()
+        fired = []
+        read = os.read
+        def racing_read(fd, size):
+            # another thread queues a callback just as the fd is drained
+            if not fired:
+                fired.append('raced')
+                waker.callbacks.append((fired.append, ('queued',)))
+                waker.wake()
+            return read(fd, size)
+        waker.wake()
+        os.read = racing_read
+        try:
+            waker.handle_read()
+        finally:
+            os.read = read
+        self.assertEqual(fired, ['raced', 'queued'])
+        # later wakeups still get through.
+        def other_thread():
+            systime.sleep(0.1)
+            waker.callbacks.append((self.loop.stop, ()))
+            waker.wake()
+        threading.Thread(target=other_thread).start()
+        self.loop.schedule(2, self.fail, "loop wasn't woken.")
+        self.loop.run()
+
+    def test_run_in_executor(self):
+        results = []
+        def blocking(delay):
+            systime.sleep(delay)
+            return delay
+        def failing():
+            raise ValueError("oops")
+        def check_done(result):
+            self.assertEqual(threading.current_thread().name, 'MainThread')
+            results.append(result)
+        def check_error(exc):
+            self.assertTrue(isinstance(exc, ValueError))
+            results.append('error')
+            self.loop.stop()
+        self.loop.run_in_executor(blocking, 0.2).on('done', check_done)
+        self.loop.run_in_executor(blocking, 0.1).on('done', check_done)
+        self.loop.schedule(0.3, lambda: self.loop.run_in_executor(
+            failing).on('error', check_error))
+        self.loop.schedule(5, self.fail, "jobs didn't finish.")
+        self.loop.run()
+        self.assertEqual(results, [0.1, 0.2, 'error'])
+
+    def test_stats(self):
+        def block():
+            systime.sleep(0.1)
+        for i in range(10):
+            self.loop.schedule(0.01 * i, block if i == 5 else lambda: None)
+        self.loop.schedule(0.5, self.loop.stop)
+        self.loop.run()
+        stats = self.loop.get_stats()
+        self.assertEqual(stats['timers_fired'], 11)
+        self.assertEqual(stats['timers_pending'], 0)
+        self.assertEqual(stats['lag']['count'], 11)
+        self.assertTrue(stats['iterations'] >= stats['callbacks']['count'])
+        self.assertTrue(0.3 < stats['poll_time'] < 0.5)
+        self.assertTrue(0.1 <= stats['callbacks']['max'] < 0.2)
+        self.assertTrue(stats['callback_time'] >= 0.1)
+        self.assertTrue(0.05 < stats['lag']['max'] < 0.2)
+        self.assertTrue(stats['lag']['p50'] < 0.01)
+        self.assertEqual(sum(stats['lag']['buckets']), 11)
+
+    def test_watchdog(self):
+        stalls = []
+        def report(loop, blocked, stack):
+            stalls.append((blocked, "".join(stack)))
+        def stuck_handler():
+            systime.sleep(0.3)
+        watchdog = thor.loop.Watchdog(self.loop, 0.1, report, 0.01)
+        watchdog.start()
+        self.loop.schedule(0.1, lambda: None)
+        self.loop.schedule(0.2, stuck_handler)
+        self.loop.schedule(0.6, self.loop.stop)
+        self.loop.run()
+        watchdog.stop()
+        self.assertEqual(len(stalls), 1)
+        self.assertTrue(0.1 <= stalls[0][0] < 0.3)
+        self.assertTrue('stuck_handler' in stalls[0][1])
+
     def test_schedule_delete(self):
         def not_good():
             assert Exception, "this event should not have happened."
@@ -100,6 +326,136 @@ class TestLoop(unittest.TestCase):
         self.loop.schedule(3, self.loop.stop)
         self.loop.run()
         
+    def test_schedule_order(self):
+        fired = []
+        for i in range(10):
+            self.loop.schedule(0.5, fired.append, i)
+        self.loop.schedule(1, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(fired, list(range(10)))
+
+    def test_schedule_delete_many(self):
+        def not_good():
+            self.fail("this event should not have happened.")
+        events = [self.loop.schedule(1, not_good) for i in range(1000)]
+        self.loop.schedule(2, self.loop.stop)
+        self.assertEqual(self.loop.timer_count(), 1001)
+        for e in events:
+            e.delete()
+            e.delete()
+        self.assertEqual(self.loop.timer_count(), 1)
+        self.loop.run()
+        self.assertEqual(self.loop.timer_count(), 0)
+
+    def test_schedule_reset(self):
+        fired = []
+        later = self.loop.schedule(0.2, fired.append, 'later')
+        sooner = self.loop.schedule(0.5, fired.append, 'sooner')
+        self.loop.schedule(0.1, later.reset, 0.5)
+        self.loop.schedule(0.1, sooner.reset, 0.1)
+        self.loop.schedule(1, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(fired, ['sooner', 'later'])
+        self.assertFalse(later.reset(1))
+        self.assertEqual(self.loop.timer_count(), 0)
+
+    def test_schedule_reset_many(self):
+        fired = []
+        timer = self.loop.schedule(0.2, fired.append, 'timer')
+        def push_back():
+            for i in range(1000):
+                timer.reset(0.2)
+            for i in range(1000):
+                timer.reset(0.1)
+        self.loop.schedule(0.1, push_back)
+        self.loop.schedule(0.25, fired.append, 'check')
+        self.loop.schedule(0.5, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(fired, ['timer', 'check'])
+        self.assertEqual(self.loop.timer_count(), 0)
+
+    def test_schedule_interval(self):
+        fired = []
+        def tick():
+            fired.append(self.loop._monotime())
+            if len(fired) == 3:
+                timer.cancel()
+        timer = self.loop.schedule_interval(0.1, tick)
+        self.loop.schedule(0.6, self.loop.stop)
+        start = systime.monotonic()
+        self.loop.run()
+        self.assertEqual(len(fired), 3)
+        self.assertTrue(fired[2] - start >= 0.3)
+        self.assertEqual(self.loop.timer_count(), 0)
+
+    def test_schedule_interval_behind(self):
+        fired = []
+        def block():
+            systime.sleep(0.35)
+        self.loop.schedule_interval(0.1, fired.append, 'tick')
+        self.loop.schedule(0.05, block)
+        self.loop.schedule(0.6, self.loop.stop)
+        self.loop.run()
+        self.assertTrue(2 <= len(fired) <= 3, fired)
+
+    def test_schedule_timeout(self):
+        run_time = 1
+        def check_time(start_time):
+            now = systime.time()
+            self.assertTrue(now - start_time >= run_time)
+            self.assertTrue(
+                now - run_time - start_time <= \
+                    self.loop.precision + self.loop._wheel.tick
+            )
+            self.loop.stop()
+        self.loop.schedule_timeout(run_time, check_time, systime.time())
+        self.loop.schedule(3, self.fail, "timeout didn't run.")
+        self.loop.run()
+
+    def test_schedule_timeout_delete(self):
+        def not_good():
+            self.fail("this event should not have happened.")
+        e = self.loop.schedule_timeout(1, not_good)
+        self.assertEqual(self.loop.timer_count(), 1)
+        self.loop.schedule(0.5, e.delete)
+        self.loop.schedule(2, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(self.loop.timer_count(), 0)
+
+    def test_schedule_timeout_earlier(self):
+        fired = []
+        self.loop.schedule_timeout(60, fired.append, 'later')
+        self.loop.schedule_timeout(0.2, fired.append, 'sooner')
+        self.loop.schedule(0.5, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(fired, ['sooner'])
+
+    def test_timing_wheel_rounds(self):
+        wheel = thor.loop.TimingWheel(self.loop, tick=0.05, slots=4)
+        fired = []
+        def check():
+            fired.append(self.loop._monotime())
+            self.loop.stop()
+        start = systime.monotonic()
+        wheel.schedule(1, check)
+        self.loop.schedule(3, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(len(fired), 1)
+        self.assertTrue(fired[0] - start >= 1)
+
+    def test_schedule_timeout_reset(self):
+        fired = []
+        def check():
+            fired.append(self.loop._monotime())
+        timeout = self.loop.schedule_timeout(0.3, check)
+        self.loop.schedule(0.2, timeout.reset, 0.5)
+        self.loop.schedule(1.5, self.loop.stop)
+        start = systime.monotonic()
+        self.loop.run()
+        self.assertEqual(len(fired), 1)
+        self.assertTrue(fired[0] - start >= 0.7)
+        self.assertEqual(self.loop.timer_count(), 0)
+
     def test_time(self):
         run_time = 2
         def check_time():
@@ -111,6 +467,55 @@ class TestLoop(unittest.TestCase):
         self.loop.run()
 
 
+class TestAsyncioLoop(TestLoop):
+
+    def setUp(self):
+        self.loop = thor.loop.AsyncioLoop()
+        self.i = 0
+
+    def test_idle_wakeups(self):
+        self.skipTest("the asyncio loop polls")
+
+    def test_idle_wakeups_timeout(self):
+        self.skipTest("the asyncio loop polls")
+
+    def test_stats(self):
+        self.skipTest("the asyncio loop polls")
+
+    def test_watchdog(self):
+        self.skipTest("no heartbeat")
+
+    def test_call_idle(self):
+        self.skipTest("idle callbacks run like call_soon")
+
+    def test_call_idle_slice(self):
+        self.skipTest("idle callbacks run like call_soon")
+
+    def test_running_asyncio(self):
+        import asyncio
+        fired = []
+        async def main():
+            self.loop = thor.loop.AsyncioLoop(
+                aio_loop=asyncio.get_running_loop())
+            self.loop.run()
+            self.loop.schedule(0.1, fired.append, 'scheduled')
+            self.loop.call_soon(fired.append, 'soon')
+            await asyncio.sleep(0.2)
+            self.loop.stop()
+        asyncio.run(main())
+        self.assertEqual(fired, ['soon', 'scheduled'])
+
+    def test_close_aio_loop(self):
+        self.loop.schedule(0.1, self.loop.stop)
+        self.loop.run()
+        aio_loop = self.loop._aio
+        self.assertTrue(aio_loop.is_closed())
+        self.loop.schedule(0.1, self.loop.stop)
+        self.loop.run()
+        self.assertFalse(self.loop._aio is aio_loop)
+        self.assertTrue(self.loop._aio.is_closed())
+
+
 class TestEventSource(unittest.TestCase):
 
     def setUp(self):
@@ -142,6 +547,19 @@ class TestEventSource(unittest.TestCase):
         self.loop._run_fd_events()
         self.assertFalse('readable' in self.events_seen)
         
+    def test_EventSource_event_coalesce(self):
+        self.es.register_fd(self.r_fd)
+        syscalls = self.loop.fd_mask_syscalls
+        for i in range(10):
+            self.es.event_add('readable')
+            self.es.event_del('readable')
+        self.loop._run_fd_events()
+        self.assertEqual(self.loop.fd_mask_changes, 20)
+        self.assertEqual(self.loop.fd_mask_syscalls, syscalls)
+        self.es.event_add('readable')
+        self.loop._run_fd_events()
+        self.assertEqual(self.loop.fd_mask_syscalls, syscalls + 1)
+
     def test_EventSource_readable(self):
         self.es.register_fd(self.r_fd, 'readable')
         self.es.on('readable', self.readable_check)
@@ -149,6 +567,16 @@ class TestEventSource(unittest.TestCase):
         self.loop._run_fd_events()
         self.assertTrue('readable' in self.events_seen)
 
+    def test_EventSource_on_readable(self):
+        self.es.register_fd(self.r_fd, 'readable',
+            on_readable=lambda: self.readable_check(b"foo"))
+        self.es.on('readable', self.fail)
+        os.write(self.w_fd, b"foo")
+        self.loop._run_fd_events()
+        self.assertTrue('readable' in self.events_seen)
+        self.es.unregister_fd()
+        self.assertEqual(self.loop._dispatch_entry(self.r_fd), None)
+
     def test_EventSource_not_readable(self):
         self.es.register_fd(self.r_fd, 'readable')
         self.es.on('readable', self.readable_check)
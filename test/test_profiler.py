@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import os
+import time as systime
+import unittest
+
+from framework import make_fifo
+
+import thor.loop
+from thor.events import EventEmitter
+import thor.profiler
+from thor.profiler import Profiler
+
+
+class Sleeper(thor.loop.EventSource):
+    def __init__(self, loop, r_fd):
+        thor.loop.EventSource.__init__(self, loop)
+        self.r_fd = r_fd
+        self.register_fd(r_fd, 'readable', on_readable=self.handle_read)
+
+    def handle_read(self):
+        os.read(self.r_fd, 5)
+        systime.sleep(0.05)
+        self.emit('slept')
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = thor.loop.make()
+        self.profiler = Profiler(self.loop)
+        self.r_fd, self.w_fd = make_fifo('tmp_fifo')
+
+    def tearDown(self):
+        self.profiler.stop()
+        os.close(self.r_fd)
+        os.close(self.w_fd)
+        os.unlink('tmp_fifo')
+
+    def test_profile(self):
+        def nap():
+            systime.sleep(0.02)
+        sleeper = Sleeper(self.loop, self.r_fd)
+        sleeper.on('slept', nap)
+        self.profiler.start()
+        os.write(self.w_fd, b"foo")
+        self.loop.schedule(0.1, nap)
+        self.loop.schedule(0.2, self.loop.stop)
+        self.loop.run()
+        results = dict([((r['source'], r['event'], r['callback']), r)
+                        for r in self.profiler.top(100)])
+        read = results[('Sleeper', 'readable', 'Sleeper.handle_read')]
+        self.assertEqual(read['count'], 1)
+        self.assertTrue(read['total'] >= 0.07)
+        listener = results[('Sleeper', 'slept',
+                            'TestProfiler.test_profile.<locals>.nap')]
+        self.assertTrue(0.02 <= listener['max'] < 0.05)
+        timer = results[('schedule', None,
+                         'TestProfiler.test_profile.<locals>.nap')]
+        self.assertEqual(timer['count'], 1)
+        top = self.profiler.top(1)[0]
+        self.assertEqual(top['callback'], 'Sleeper.handle_read')
+        self.assertTrue('Sleeper.handle_read' in self.profiler.report(3))
+
+    def test_stop(self):
+        sleeper = Sleeper(self.loop, self.r_fd)
+        self.profiler.start()
+        self.assertTrue(self.loop.profiler is self.profiler)
+        self.profiler.stop()
+        self.assertTrue(self.loop.profiler is None)
+        self.assertTrue(EventEmitter.emit is thor.profiler._plain_emit)
+        entry = self.loop._dispatch_entry(self.r_fd)
+        self.assertEqual(entry[1], sleeper.handle_read)
+        os.write(self.w_fd, b"foo")
+        self.loop.schedule(0.1, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(self.profiler.top(), [])
+
+    def test_two_loops(self):
+        def on_a():
+            pass
+        def on_b():
+            pass
+        other = thor.loop.make()
+        source = thor.loop.EventSource(other)
+        source.on('ping', on_b)
+        unbound = EventEmitter()
+        unbound.on('ping', on_a)
+        self.profiler.start()
+        self.loop.schedule(0.05, source.emit, 'ping')
+        self.loop.schedule(0.05, unbound.emit, 'ping')
+        self.loop.schedule(0.1, self.loop.stop)
+        self.loop.run()
+        keys = [(r['source'], r['event'], r['callback'].split('.')[-1])
+                for r in self.profiler.top(100)]
+        self.assertTrue(('EventEmitter', 'ping', 'on_a') in keys)
+        self.assertFalse(('EventSource', 'ping', 'on_b') in keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@
 
 import socket
 import sys
+import tempfile
+import threading
 import time
 import unittest
 
@@ -49,8 +51,274 @@ class TestTcpServer(framework.ClientServerTestCase):
         self.go([server_side], [client_side])
         self.assertTrue(self.server_recv > 0, self.server_recv)
  
+    def test_pause(self):
+        self.server_recv = b''
+        def server_side(server_conn):
+            def check_data(chunk):
+                self.server_recv += chunk
+            server_conn.on('data', check_data)
+            # data arrives while paused; it's read once we unpause.
+            self.loop.schedule(0.5, server_conn.pause, False)
+
+        def client_side(client_conn):
+            client_conn.sendall(b'foo!' * 10000)
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.server_recv, b'foo!' * 10000)
+
+    def test_read_budget(self):
+        self.server_recv = b''
+        def server_side(server_conn):
+            server_conn.read_budget = 1024 * 32
+            def check_data(chunk):
+                self.server_recv += chunk
+            server_conn.on('data', check_data)
+            server_conn.pause(False)
+
+        def client_side(client_conn):
+            client_conn.sendall(b'foo!' * 100000)
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.server_recv, b'foo!' * 100000)
+
+    def test_read_buffer(self):
+        self.server_recv = b''
+        def server_side(server_conn):
+            def check_data(chunk):
+                self.assertEqual(type(chunk), memoryview)
+                self.server_recv += chunk
+            server_conn.on('data', thor.tcp.BufferListener(check_data))
+            server_conn.pause(False)
+
+        def client_side(client_conn):
+            client_conn.sendall(b'foo!' * 100000)
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.server_recv, b'foo!' * 100000)
+
+    def test_write_large(self):
+        self.client_recv = b''
+        def server_side(server_conn):
+            server_conn.write(b'bar!' * 100000)
+            server_conn.close()
+
+        def client_side(client_conn):
+            while True:
+                data = client_conn.recv(65536)
+                if not data:
+                    break
+                self.client_recv += data
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.client_recv, b'bar!' * 100000)
+
+    def test_write_many(self):
+        self.client_recv = b''
+        chunks = [b'', b'b', b'ar!' * 10000, b'', b'baz!' * 50000] * 10
+        def server_side(server_conn):
+            for chunk in chunks:
+                server_conn.write(chunk)
+            server_conn.close()
+
+        def client_side(client_conn):
+            while True:
+                data = client_conn.recv(4096)
+                if not data:
+                    break
+                self.client_recv += data
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.client_recv, b''.join(chunks))
+
+    def test_write_watermarks(self):
+        self.client_recv = b''
+        self.pauses = []
+        def server_side(server_conn):
+            server_conn.on('pause', self.pauses.append)
+            for i in range(15):
+                server_conn.write(b'x') # lots of small writes don't pause
+            self.assertEqual(self.pauses, [])
+            server_conn.write(b'y' * 1024 * 1024) # one large one does
+            server_conn.write(b'z') # but only once
+            self.assertEqual(self.pauses, [True])
+            self.assertEqual(server_conn.write_buffered, 15 + 1024 * 1024 + 1)
+            server_conn.close()
+
+        def client_side(client_conn):
+            while True:
+                data = client_conn.recv(4096)
+                if not data:
+                    break
+                self.client_recv += data
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.pauses, [True, False])
+        self.assertEqual(len(self.client_recv), 15 + 1024 * 1024 + 1)
+
+    def test_read_watermarks(self):
+        self.server_recv = b''
+        self.held = []
+        def server_side(server_conn):
+            server_conn.read_high_water = 1024 * 64
+            server_conn.read_low_water = 1024 * 16
+            def check_data(chunk):
+                self.server_recv += chunk
+                self.assertTrue(server_conn.read_buffered <=
+                    server_conn.read_high_water + server_conn.read_bufsize)
+                if server_conn._input_paused:
+                    self.held.append(server_conn.read_buffered)
+                    # the app gets around to it later.
+                    self.loop.schedule(0.01, server_conn.consumed,
+                                       server_conn.read_buffered)
+            server_conn.on('data', check_data)
+            server_conn.pause(False)
+
+        def client_side(client_conn):
+            client_conn.sendall(b'foo!' * 100000)
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.server_recv, b'foo!' * 100000)
+        self.assertTrue(len(self.held) > 0)
+
+    def test_accept_batch(self):
+        self.addCleanup(setattr, thor.TcpServer, 'accept_batch',
+                        thor.TcpServer.accept_batch)
+        thor.TcpServer.accept_batch = 2
+        self.accepted = 0
+        def server_side(server_conn):
+            self.accepted += 1
+            server_conn.close()
+
+        def client_side(client_conn):
+            socks = [socket.create_connection(
+                (framework.test_host, framework.test_port))
+                for i in range(9)]
+            time.sleep(0.5)
+            for sock in socks:
+                sock.close()
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.accepted, 10)
+
+    def check_sendfile(self, scatter):
+        body = b'0123456789' * 100000
+        fh = tempfile.TemporaryFile()
+        fh.write(body)
+        fh.flush()
+        self.client_recv = b''
+        def server_side(server_conn):
+            server_conn._scatter = scatter # False is how TLS sends
+            server_conn.write(b'<')
+            server_conn.sendfile(fh)
+            server_conn.sendfile(fh.fileno(), 5, 10)
+            self.assertEqual(server_conn.write_buffered, 1 + len(body) + 10)
+            server_conn.write(b'>')
+            server_conn.close()
+
+        def client_side(client_conn):
+            while True:
+                data = client_conn.recv(65536)
+                if not data:
+                    break
+                self.client_recv += data
+
+        self.go([server_side], [client_side])
+        fh.close()
+        self.assertEqual(self.client_recv, b'<' + body + body[5:15] + b'>')
+
+    def test_sendfile(self):
+        self.check_sendfile(True)
+        self.check_sendfile(False)
+
+    def check_write_policy(self, policy, cork=False):
+        self.client_recv = b''
+        self.sends = 0
+        def server_side(server_conn):
+            server_conn.write_policy = policy
+            sock = server_conn.socket
+            class CountingSocket(object):
+                def __getattr__(_self, name):
+                    return getattr(sock, name)
+                def sendmsg(_self, *args):
+                    self.sends += 1
+                    return sock.sendmsg(*args)
+                def send(_self, *args):
+                    self.sends += 1
+                    return sock.send(*args)
+            server_conn.socket = CountingSocket()
+            if cork:
+                server_conn.cork()
+            for chunk in [b'foo', b'bar', b'baz']:
+                server_conn.write(chunk)
+            if cork:
+                self.loop.schedule(0.1, server_conn.uncork)
+                self.loop.schedule(0.2, server_conn.close)
+            else:
+                server_conn.close()
+
+        def client_side(client_conn):
+            while True:
+                data = client_conn.recv(4096)
+                if not data:
+                    break
+                self.client_recv += data
+
+        self.go([server_side], [client_side])
+        self.assertEqual(self.client_recv, b'foobarbaz')
+        return self.sends
+
+    def test_write_policies(self):
+        self.assertEqual(self.check_write_policy('iteration'), 1)
+        self.assertEqual(self.check_write_policy('poll'), 1)
+        self.assertEqual(self.check_write_policy('immediate'), 3)
+        self.assertEqual(self.check_write_policy('immediate', cork=True), 1)
+
+
+class TestTcpServerEdgeTriggered(TestTcpServer):
+
+    def setUp(self):
+        self.loop = thor.loop.make(edge_triggered=True)
+        self.timeout_hit = False
+
+
+class TestTcpServerAsyncio(TestTcpServer):
+
+    def setUp(self):
+        self.loop = thor.loop.AsyncioLoop()
+        self.timeout_hit = False
+
+
+class TestTcpServerLoopThreads(unittest.TestCase):
+
+    def test_reuse_port(self):
+        conns = {}
+        lock = threading.Lock()
+        def setup(loop):
+            server = thor.TcpServer(framework.test_host, framework.test_port,
+                                    loop=loop, reuse_port=True)
+            @on(server)
+            def connect(conn):
+                self.assertTrue(conn._loop is loop)
+                with lock:
+                    conns[loop] = conns.get(loop, 0) + 1
+                conn.close()
+            loop.on('stop', server.shutdown)
+        threads = thor.loop.LoopThreads(2, setup)
+        threads.start()
+        time.sleep(0.2)
+        for i in range(20):
+            client = socket.create_connection(
+                (framework.test_host, framework.test_port))
+            client.recv(1)
+            client.close()
+        threads.stop()
+        threads.join(5)
+        self.assertEqual(sum(conns.values()), 20)
+        for thread in threads.threads:
+            self.assertFalse(thread.is_alive())
+
+
 # TODO:
-#   def test_pause(self):
 #   def test_shutdown(self):
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import io
+import json
+import os
+import time as systime
+import unittest
+
+from framework import make_fifo, test_host, test_port
+
+import thor.loop
+from thor.events import on
+from thor.http import HttpClient, HttpServer
+from thor.tracer import Tracer
+
+
+class Sleeper(thor.loop.EventSource):
+    def __init__(self, loop, r_fd):
+        thor.loop.EventSource.__init__(self, loop)
+        self.r_fd = r_fd
+        self.register_fd(r_fd, 'readable', on_readable=self.handle_read)
+
+    def handle_read(self):
+        os.read(self.r_fd, 5)
+        systime.sleep(0.05)
+        self.emit('slept')
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = thor.loop.make()
+        self.tracer = Tracer(self.loop, 100)
+        self.r_fd, self.w_fd = make_fifo('tmp_fifo')
+
+    def tearDown(self):
+        self.tracer.stop()
+        os.close(self.r_fd)
+        os.close(self.w_fd)
+        os.unlink('tmp_fifo')
+
+    def test_trace(self):
+        def nap():
+            systime.sleep(0.02)
+        sleeper = Sleeper(self.loop, self.r_fd)
+        sleeper.on('slept', nap)
+        self.tracer.start()
+        self.assertTrue(self.loop.tracer is self.tracer)
+        os.write(self.w_fd, b"foo")
+        self.loop.schedule(0.2, self.loop.stop)
+        self.loop.run()
+        spans = dict([((s[0], s[1]), s) for s in self.tracer.spans()])
+        read = spans[('Sleeper', 'readable')]
+        self.assertEqual(read[2], 'Sleeper.handle_read')
+        self.assertTrue(read[4] - read[3] >= 0.07)
+        slept = spans[('Sleeper', 'slept')]
+        self.assertTrue(read[3] <= slept[3] <= slept[4] <= read[4])
+        polls = [s for s in self.tracer.spans() if s[:2] == ('loop', 'poll')]
+        self.assertTrue(polls[0][4] <= read[3])
+        self.assertTrue(('loop', 'iteration') in spans)
+        out = io.StringIO()
+        self.tracer.dump(out)
+        events = json.loads(out.getvalue())['traceEvents']
+        self.assertEqual(len(events), len(self.tracer.spans()))
+        names = [e['name'] for e in events]
+        self.assertTrue('Sleeper readable' in names)
+        self.assertTrue(all([e['ph'] == 'X' for e in events]))
+
+    def test_ring(self):
+        self.tracer.start()
+        for i in range(250):
+            self.loop.call_soon(lambda: None)
+        self.loop.schedule(0.1, self.loop.stop)
+        self.loop.run()
+        spans = self.tracer.spans()
+        self.assertTrue(self.tracer.recorded > 250)
+        self.assertEqual(len(spans), 100)
+        ends = [s[4] for s in spans]
+        self.assertEqual(ends, sorted(ends))
+        self.tracer.clear()
+        self.assertEqual(self.tracer.spans(), [])
+
+    def test_two_tracers(self):
+        other = Tracer(thor.loop.make(), 100)
+        other.start()
+        self.addCleanup(other.stop)
+        self.tracer.start()
+        server = HttpServer(test_host, test_port, loop=self.loop)
+        self.addCleanup(server.shutdown)
+        @on(server)
+        def exchange(server_exchange):
+            @on(server_exchange)
+            def request_done(trailers):
+                server_exchange.response_start("200", "OK",
+                                               [("Content-Length", "0")])
+                server_exchange.response_done([])
+        client = HttpClient(loop=self.loop)
+        exchange = client.exchange()
+        exchange.on('response_done', lambda trailers: self.loop.stop())
+        exchange.request_start("GET",
+                               "http://%s:%s/" % (test_host, test_port), [])
+        exchange.request_done([])
+        self.loop.schedule(2, self.loop.stop)
+        self.loop.run()
+        sources = [s[0] for s in self.tracer.spans()]
+        self.assertTrue('HttpServerExchange' in sources)
+        self.assertTrue('HttpClientExchange' in sources)
+        self.assertEqual(other.spans(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,34 +30,67 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-from collections import defaultdict
+import weakref
 
 
 class EventEmitter(object):
     """
     An event emitter, in the style of Node.JS.
+
+    Listener storage is allocated when the first listener is added, and an
+    event with one listener stores it without a list, since most emitters
+    are short-lived and have few listeners.
     """
+    __slots__ = ('__events', '__sink')
 
     def __init__(self):
-        self.__events = defaultdict(list)
+        self.__events = None # event: listener, or list of listeners
         self.__sink = None
 
     def __getstate__(self):
-        state = self.__dict__.copy()
-        del state["_EventEmitter__events"]
+        state = getattr(self, '__dict__', {}).copy()
+        state['_EventEmitter__sink'] = self.__sink
         return state
 
-    def on(self, event, listener):
+    def __setstate__(self, state):
+        state = state.copy()
+        self.__events = None
+        self.__sink = state.pop('_EventEmitter__sink', None)
+        if state:
+            self.__dict__.update(state)
+
+    def on(self, event, listener, weak=False):
         """
         Call listener when event is emitted.
-        """
-        self.__events[event].append(listener)
-        self.emit('newListener', event, listener)
 
-    def once(self, event, listener):
+        If weak is True, listener must be a bound method, and the emitter
+        won't keep its object alive; once the object is gone, the listener
+        does nothing, and is dropped when another is added for the event.
+        """
+        if weak:
+            listener = WeakListener(listener)
+        events = self.__events
+        if events is None:
+            events = self.__events = {}
+        existing = events.get(event, None)
+        if existing is None or _is_dead(existing):
+            events[event] = listener
+        elif type(existing) is list:
+            if weak: # a new list, in case it's being emitted to
+                existing = [l for l in existing if not _is_dead(l)]
+                events[event] = existing
+            existing.append(listener)
+        else:
+            events[event] = [existing, listener]
+        if self.__sink is not None or 'newListener' in events:
+            self.emit('newListener', event, listener)
+
+    def once(self, event, listener, weak=False):
         """
-        Call listener the first time event is emitted.
+        Call listener the first time event is emitted. See on() for weak.
         """
+        if weak:
+            listener = WeakListener(listener)
         def mycall(*args):
             listener(*args)
             self.removeListener(event, mycall)
@@ -70,7 +103,18 @@ class EventEmitter(object):
         If called for a specific listener by a previous listener
         for the same event, that listener will not be fired.
         """
-        self.__events.get(event, [listener]).remove(listener)
+        events = self.__events
+        if events is None or event not in events:
+            return
+        existing = events[event]
+        if type(existing) is list:
+            existing.remove(listener) # in place, for emit's sake
+            if not existing:
+                del events[event]
+        elif existing == listener:
+            del events[event]
+        else:
+            raise ValueError("listener not found")
 
     def removeListeners(self, *events):
         """
@@ -81,21 +125,31 @@ class EventEmitter(object):
         for that event will still be fired.
         """
         if events:
-            for event in events:
-                self.__events[event] = []
+            if self.__events is not None:
+                for event in events:
+                    self.__events.pop(event, None)
         else:
-            self.__events = defaultdict(list)
+            self.__events = None
 
     def listeners(self, event):
         """
         Return a list of listeners for an event.
         """
-        return self.__events.get(event, [])
+        if self.__events is None:
+            return []
+        existing = self.__events.get(event, None)
+        if existing is None:
+            return []
+        if type(existing) is list:
+            return existing
+        return [existing]
 
     def events(self):
         """
         Return a list of events being listened for.
         """
+        if self.__events is None:
+            return []
         return list(self.__events.keys())
 
     def emit(self, event, *args):
@@ -103,14 +157,18 @@ class EventEmitter(object):
         Emit the event (with any given args) to
         its listeners.
         """
-        events = self.__events.get(event, [])
-        if len(events):
-            for e in events:
-                e(*args)
-        else:
-            sink_event = getattr(self.__sink, event, None)
-            if sink_event:
-                sink_event(*args)
+        if self.__events is not None:
+            listeners = self.__events.get(event, None)
+            if listeners is not None:
+                if type(listeners) is list:
+                    for listener in listeners:
+                        listener(*args)
+                else:
+                    listeners(*args)
+                return
+        sink_event = getattr(self.__sink, event, None)
+        if sink_event:
+            sink_event(*args)
 
     def sink(self, sink):
         """
@@ -123,6 +181,40 @@ class EventEmitter(object):
     # TODO: event bubbling
 
 
+class WeakListener(object):
+    """
+    Calls a bound method without keeping its object alive; see
+    EventEmitter.on. Compares equal to the method, so that it can be
+    removed with removeListener.
+    """
+    __slots__ = ('method',)
+
+    def __init__(self, method):
+        self.method = weakref.WeakMethod(method)
+
+    def __repr__(self):
+        return "<%s.%s for %r>" % (
+            self.__class__.__module__, self.__class__.__name__,
+            self.method())
+
+    def __call__(self, *args):
+        method = self.method()
+        if method is not None:
+            method(*args)
+
+    def __eq__(self, other):
+        if isinstance(other, WeakListener):
+            return self.method == other.method
+        return self.method() == other
+
+    __hash__ = None
+
+
+def _is_dead(listener):
+    "Return whether listener is a WeakListener whose object has gone."
+    return type(listener) is WeakListener and listener.method() is None
+
+
 def on(obj, event=None):
     """
     Decorator to call a function when an object emits
@@ -38,7 +38,8 @@ from collections import defaultdict
 from urllib.parse import urlsplit, urlunsplit
 
 from thor.events import EventEmitter, on
-from thor.tcp import TcpClient
+import thor.loop
+from thor.tcp import TcpClient, BufferListener
 from thor.tls import TlsClient, TlsConfig
 from thor.http.common import HttpMessageHandler, \
     CLOSE, COUNTED, CHUNKED, NOBODY, \
@@ -72,7 +73,7 @@ class HttpClient(object):
         self.tls_config = tls_config
         self._idle_conns = defaultdict(list)
         self._conn_counts = defaultdict(int)
-        self.loop.on('stop', self._close_conns)
+        self.loop.on('stop', self._close_conns, weak=True)
 
     def exchange(self):
         return HttpClientExchange(self)
@@ -126,7 +127,7 @@ class HttpClient(object):
                     pass
             tcp_conn.on('close', idle_close)
             if self.idle_timeout > 0:
-                tcp_conn._idler = self.loop.schedule(
+                tcp_conn._idler = self.loop.schedule_timeout(
                     self.idle_timeout, tcp_conn.close
                 )
             else:
@@ -186,6 +187,7 @@ class HttpClientExchange(HttpMessageHandler, EventEmitter):
         self._req_started = False
         self._retries = 0
         self._read_timeout_ev = None
+        self._read_timeout_kind = None
         self._output_buffer = []
 
     def __repr__(self):
@@ -298,7 +300,7 @@ class HttpClientExchange(HttpMessageHandler, EventEmitter):
         "The connection has succeeded."
         self.tcp_conn = tcp_conn
         self._set_read_timeout('connect')
-        tcp_conn.on('data', self.handle_input)
+        tcp_conn.on('data', BufferListener(self.handle_input))
         tcp_conn.on('close', self._conn_closed)
         tcp_conn.on('pause', self._req_body_pause)
         # FIXME: should this be done AFTER _req_start?
@@ -393,9 +395,8 @@ class HttpClientExchange(HttpMessageHandler, EventEmitter):
 
     def input_body(self, chunk):
         "Process a response body chunk from the wire."
-        self._clear_read_timeout()
+        self._refresh_read_timeout('body')
         self.emit('response_body', chunk)
-        self._set_read_timeout('body')
 
     def input_end(self, trailers):
         "Indicate that the response body is complete."
@@ -431,7 +432,9 @@ class HttpClientExchange(HttpMessageHandler, EventEmitter):
         self.client._dead_conn(self.origin)
 
     def output(self, chunk):
-        self._output_buffer.append(chunk.encode())
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        self._output_buffer.append(chunk)
         if self.tcp_conn and self.tcp_conn.tcp_connected:
             self.tcp_conn.write(b"".join(self._output_buffer))
             self._output_buffer = []
@@ -441,11 +444,19 @@ class HttpClientExchange(HttpMessageHandler, EventEmitter):
     def _set_read_timeout(self, kind):
         "Set the read timeout."
         if self.client.read_timeout:
-            self._read_timeout_ev = self.client.loop.schedule(
+            self._read_timeout_kind = kind
+            self._read_timeout_ev = self.client.loop.schedule_timeout(
                 self.client.read_timeout, self.input_error,
                 ReadTimeoutError(kind)
             )
 
+    def _refresh_read_timeout(self, kind):
+        "Push the read timeout back, or replace it if it's for another kind."
+        if not (self._read_timeout_ev and self._read_timeout_kind == kind
+                and self._read_timeout_ev.reset(self.client.read_timeout)):
+            self._clear_read_timeout()
+            self._set_read_timeout(kind)
+
     def _clear_read_timeout(self):
         "Clear the read timeout."
         if self._read_timeout_ev:
@@ -110,6 +110,8 @@ class HttpMessageHandler:
     """
 
     inspecting = False # if True, don't fail on errors, but preserve them.
+    input_budget = None # messages to parse per chunk of input; see input_defer
+
 
     def __init__(self):
         self.input_header_length = 0
@@ -118,6 +120,8 @@ class HttpMessageHandler:
         self._input_state = WAITING
         self._input_delimit = None
         self._input_body_left = 0
+        self._input_count = 0 # messages parsed from this chunk of input
+        self._input_deferred = False
         self._output_state = WAITING
         self._output_delimit = None
 
@@ -152,13 +156,45 @@ class HttpMessageHandler:
         "Indicate an unrecoverable parsing problem with the input stream."
         raise NotImplementedError
 
+    def input_defer(self):
+        """
+        More than input_budget messages have arrived in one chunk of input;
+        arrange for _input_resume to be called later (e.g., on the next loop
+        iteration), so that other connections get a turn.
+        """
+        raise NotImplementedError
+
     def handle_input(self, instr):
         """
         Given a chunk of input, figure out what state we're in and handle it,
         making the appropriate calls.
         """
-        if type(instr) == bytes: # convert to string
-            instr = instr.decode(encoding='utf8', errors='strict') # error can happen here if receiving TLS input over plain TCP
+        if type(instr) != str: # convert bytes or a memoryview to string
+            instr = str(instr, encoding='utf8', errors='strict') # error can happen here if receiving TLS input over plain TCP
+        if self._input_deferred: # keep it until we get back to it
+            self._input_buffer += instr
+            return
+        self._input_count = 0
+        self._parse_input(instr)
+
+    def _input_resume(self):
+        "Parse the input left over by input_defer."
+        self._input_deferred = False
+        self.handle_input("")
+
+    def _input_next(self, instr):
+        "A message is complete; parse what follows it, if it's our turn."
+        self._input_count += 1
+        if instr and self.input_budget and \
+          self._input_count >= self.input_budget:
+            self._input_buffer = instr
+            self._input_deferred = True
+            self.input_defer()
+        else:
+            self._parse_input(instr)
+
+    def _parse_input(self, instr):
+        "Parse a chunk of input."
         if self._input_buffer != "":
             # will need to move to a list if writev comes around
             instr = self._input_buffer + instr
@@ -167,7 +203,7 @@ class HttpMessageHandler:
             if hdr_end.search(instr): # found one
                 rest = self._parse_headers(instr)
                 try:
-                    self.handle_input(rest)
+                    self._parse_input(rest)
                 except RuntimeError:
                     self.input_error(error.TooManyMsgsError)
                     # we can't recover from this, so we bail.
@@ -189,7 +225,7 @@ class HttpMessageHandler:
         "Handle input that shouldn't have a body."
         self.input_end([])
         self._input_state = WAITING
-        self.handle_input(instr)
+        self._input_next(instr)
 
     def _handle_close(self, instr):
         "Handle input where the body is delimited by the connection closing."
@@ -255,7 +291,7 @@ class HttpMessageHandler:
         if len(instr) >= 2 and instr[:2] == linesep:
             self._input_state = WAITING
             self.input_end([])
-            self.handle_input(instr[2:]) # 2 consumes the CRLF
+            self._input_next(instr[2:]) # 2 consumes the CRLF
         elif hdr_end.search(instr): # trailers
             self._input_state = WAITING
             trailer_block, rest = hdr_end.split(instr, 1)
@@ -265,7 +301,7 @@ class HttpMessageHandler:
                 return
             else:
                 self.input_end(trailers)
-                self.handle_input(rest)
+                self._input_next(rest)
         else: # don't have full trailers yet
             self._input_buffer = instr
 
@@ -277,7 +313,7 @@ class HttpMessageHandler:
             self.input_end([])
             self._input_state = WAITING
             if instr[self._input_body_left:]:
-                self.handle_input(instr[self._input_body_left:])
+                self._input_next(instr[self._input_body_left:])
         else: # got some of it
             self.input_body(instr)
             self.input_transfer_length += len(instr)
@@ -435,9 +471,16 @@ class HttpMessageHandler:
         """
         if not chunk or self._output_delimit == None:
             return
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
         if self._output_delimit == CHUNKED:
-            chunk = "%s\r\n%s\r\n" % (hex(len(chunk))[2:], chunk)
-        self.output(chunk)
+            # written separately, so the chunk isn't copied; they're still
+            # sent together.
+            self.output("%s\r\n" % hex(len(chunk))[2:])
+            self.output(chunk)
+            self.output("\r\n")
+        else:
+            self.output(chunk)
         # TODO: body counting
 #        self._output_body_sent += len(chunk)
 #        assert self._output_body_sent <= self._output_content_length, \
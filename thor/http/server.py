@@ -7,7 +7,8 @@ This library allow implementation of an HTTP/1.1 server that is
 "non-blocking," "asynchronous" and "event-driven" -- i.e., it achieves very
 high performance and concurrency, so long as the application code does not
 block (e.g., upon network, disk or database access). Blocking on one request
-will block the entire server.
+will block the entire server; use the loop's run_in_executor to do blocking
+work in another thread.
 
 """
 
@@ -37,9 +38,9 @@ THE SOFTWARE.
 import os
 import sys
 
-from thor.loop import schedule
 from thor.events import EventEmitter, on
-from thor.tcp import TcpServer
+import thor.loop
+from thor.tcp import TcpServer, BufferListener
 from thor.tls import TlsServer, TlsConfig
 from thor.http.common import HttpMessageHandler, \
     CLOSE, COUNTED, CHUNKED, \
@@ -56,20 +57,28 @@ class HttpServer(EventEmitter):
     tcp_server_class = TcpServer
     tls_server_class = TlsServer
     idle_timeout = 60 # in seconds
+    input_budget = 16 # pipelined requests to parse per loop iteration
+    # hold each response until it's done, so that it's sent in one go, even
+    # if it takes more than one loop iteration; see TcpConnection.cork.
+    cork_responses = False
 
-    def __init__(self, host, port, loop=None, tls_config=None):
+    def __init__(self, host, port, loop=None, tls_config=None,
+                 reuse_port=False):
         EventEmitter.__init__(self)
+        self.loop = loop or thor.loop._loop
         if not tls_config:
-            self.tcp_server = self.tcp_server_class(host, port, loop=loop)
+            self.tcp_server = self.tcp_server_class(host, port, loop=loop,
+                reuse_port=reuse_port)
         else:
-            self.tcp_server = self.tls_server_class(host, port, tls_config, loop=loop)
+            self.tcp_server = self.tls_server_class(host, port, tls_config,
+                loop=loop, reuse_port=reuse_port)
         self.tcp_server.on('connect', self.handle_conn)
         self.tcp_server.on('connect_error', self.handle_error)
-        schedule(0, self.emit, 'start')
+        self.loop.call_soon(self.emit, 'start')
 
     def handle_conn(self, tcp_conn):
         http_conn = HttpServerConnection(tcp_conn, self)
-        tcp_conn.on('data', http_conn.handle_input)
+        tcp_conn.on('data', BufferListener(http_conn.handle_input))
         tcp_conn.on('close', http_conn.conn_closed)
         tcp_conn.on('pause', http_conn.res_body_pause)
         tcp_conn.pause(False)
@@ -93,13 +102,18 @@ class HttpServerConnection(HttpMessageHandler, EventEmitter):
         self.server = server
         self.ex_queue = [] # queue of exchanges
         self.output_paused = False
+        self.input_budget = server.input_budget
+        self._input_resume_ev = None
+        self._req_paused = False # by req_body_pause
 
     def req_body_pause(self, paused):
         """
         Indicate that the server should pause (True) or unpause (False) the
         request.
         """
-        self.tcp_conn.pause(paused)
+        self._req_paused = paused
+        if not self._input_deferred: # otherwise, it's paused until resumed
+            self.tcp_conn.pause(paused)
 
     # Methods called by tcp
 
@@ -116,11 +130,37 @@ class HttpServerConnection(HttpMessageHandler, EventEmitter):
 #            exchange.pause() # FIXME - maybe a connclosed err?
         self.ex_queue = []
         self.tcp_conn = None
+        if self._input_resume_ev:
+            self._input_resume_ev.delete()
+            self._input_resume_ev = None
 
     # Methods called by common.HttpRequestHandler
 
     def output(self, data):
-        self.tcp_conn.write(data.encode())
+        if isinstance(data, str):
+            data = data.encode()
+        self.tcp_conn.write(data)
+
+    def output_file(self, fh, offset, count):
+        "Output count bytes of file fh from offset, as part of the body."
+        if not count or self._output_delimit == None:
+            return
+        if self._output_delimit == CHUNKED:
+            self.output("%s\r\n" % hex(count)[2:])
+            self.tcp_conn.sendfile(fh, offset, count)
+            self.output("\r\n")
+        else:
+            self.tcp_conn.sendfile(fh, offset, count)
+
+    def output_start(self, top_line, hdr_tuples, delimit):
+        if self.server.cork_responses:
+            self.tcp_conn.cork()
+        HttpMessageHandler.output_start(self, top_line, hdr_tuples, delimit)
+
+    def output_end(self, trailers):
+        HttpMessageHandler.output_end(self, trailers)
+        if self.server.cork_responses and self.tcp_conn:
+            self.tcp_conn.uncork()
 
     def input_start(self, top_line, hdr_tuples, conn_tokens,
         transfer_codes, content_length):
@@ -164,6 +204,22 @@ class HttpServerConnection(HttpMessageHandler, EventEmitter):
         "Indicate that the request body is complete."
         self.ex_queue[-1].emit('request_done', trailers)
 
+    def input_defer(self):
+        """
+        Parse the rest of the input on the next loop iteration, leaving any
+        more in the kernel until then.
+        """
+        self.tcp_conn.pause(True)
+        self._input_resume_ev = self.server.loop.call_soon(
+            self._input_resume)
+
+    def _input_resume(self):
+        self._input_resume_ev = None
+        HttpMessageHandler._input_resume(self)
+        if not self._input_deferred and not self._req_paused \
+          and self.tcp_conn:
+            self.tcp_conn.pause(False)
+
     def input_error(self, err):
         """
         Indicate a parsing problem with the request body (which
@@ -256,6 +312,20 @@ class HttpServerExchange(EventEmitter):
         "Send part of the response body. May be called zero to many times."
         self.http_conn.output_body(chunk)
 
+    def response_file(self, fh, offset=0, count=None):
+        """
+        Send count bytes of file fh (a file object or descriptor) from
+        offset as part of the response body; if count is None, to the end
+        of the file. May be called zero to many times, like response_body.
+
+        The file is sent by the kernel, without being read into memory,
+        when the connection gets to it; see TcpConnection.sendfile.
+        """
+        fd = fh if isinstance(fh, int) else fh.fileno()
+        if count is None:
+            count = os.fstat(fd).st_size - offset
+        self.http_conn.output_file(fh, offset, count)
+
     def response_done(self, trailers):
         """
         Signal the end of the response, whether or not there was a body. MUST
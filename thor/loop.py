@@ -30,10 +30,19 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-import bisect
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from heapq import heappush, heappop, heapify, heapreplace
+import errno
+import math
+import os
 import select
 import sys
+import threading
 import time as systime
+import traceback
 
 from thor.events import EventEmitter
 
@@ -48,19 +57,35 @@ class EventSource(EventEmitter):
 
     An instance should map to one thing with an interesting file
     descriptor, registered with register_fd.
+
+    Subclasses whose readable and writable handlers keep going until
+    the fd would block can set _edge_triggered to True, so that loops in
+    edge-triggered mode can avoid changing the fd's registration.
     """
+    _edge_triggered = False
+
     def __init__(self, loop=None):
         EventEmitter.__init__(self)
         self._loop = loop or _loop
         self._interesting_events = set()
         self._fd = None
+        self._fd_handlers = None
 
-    def register_fd(self, fd, event=None):
+    def register_fd(self, fd, event=None,
+                    on_readable=None, on_writable=None, on_hangup=None):
         """
         Register myself with the loop using file descriptor fd.
         If event is specified, start emitting it.
+
+        If on_readable, on_writable or on_hangup are given, the loop calls
+        them directly instead of emitting 'readable', 'writable' or 'close'
+        respectively; listeners for those events won't see them.
         """
         self._fd = fd
+        if on_readable or on_writable or on_hangup:
+            self._fd_handlers = (on_readable, on_writable, on_hangup)
+        else:
+            self._fd_handlers = None
         self._loop.register_fd(self._fd, [], self)
         self.event_add(event)
 
@@ -69,6 +94,7 @@ class EventSource(EventEmitter):
         if self._fd:
             self._loop.unregister_fd(self._fd)
             self._fd = None
+            self._interesting_events.clear()
 
     def event_add(self, event):
         "Start emitting the given event."
@@ -83,19 +109,425 @@ class EventSource(EventEmitter):
             self._loop.event_del(self._fd, event)
 
 
+class Timer(object):
+    """
+    A scheduled event, as returned by LoopBase.schedule,
+    LoopBase.schedule_interval and LoopBase.schedule_timeout.
+    """
+    __slots__ = ('_owner', '_when', '_callback', '_args', '_seq', '_interval')
+
+    def __init__(self, owner, when, callback, args):
+        self._owner = owner # the queue holding the timer
+        self._when = when # monotonic deadline
+        self._callback = callback
+        self._args = args
+        self._seq = None # the owner's bookkeeping
+        self._interval = None # seconds between runs, if repeating
+
+    def __repr__(self):
+        status = [self.__class__.__module__ + "." + self.__class__.__name__]
+        if self._callback is None:
+            status.append('done')
+        else:
+            status.append(getattr(
+                self._callback, '__qualname__', repr(self._callback)))
+        return "<%s at %#x>" % (", ".join(status), id(self))
+
+    def delete(self):
+        "Remove the event, if it hasn't run yet."
+        if self._callback is not None:
+            self._callback = self._args = None
+            self._owner._timer_deleted(self)
+
+    cancel = delete
+
+    def reset(self, delay):
+        """
+        Move the event's deadline to delay seconds from now, keeping its
+        callback. This is cheaper than deleting it and scheduling another.
+
+        Returns False (and does nothing) if the event has already run or
+        been deleted.
+        """
+        if self._callback is None:
+            return False
+        self._owner._timer_reset(self, delay)
+        return True
+
+
+class ReadyQueue(deque):
+    """
+    A FIFO of Timers to run on the next loop iteration (or, for call_idle,
+    the next one with spare capacity).
+    """
+
+    def _timer_deleted(self, timer):
+        pass # skipped when its turn comes
+
+    def _timer_reset(self, timer, delay):
+        raise ValueError("call_soon and call_idle callbacks don't have a "
+                         "deadline")
+
+
+class TimingWheel(object):
+    """
+    A hashed timing wheel, for timeouts that don't need to be precise and
+    usually get deleted before they run (e.g., idle and read timeouts).
+
+    Adding and deleting a timeout are O(1), regardless of how many are
+    pending; in exchange, they run up to one tick after their deadline.
+    The wheel is driven by a single event on the loop's own schedule, for
+    the first tick that has a timeout; it's only present while the wheel
+    has timeouts.
+    """
+
+    def __init__(self, loop, tick=0.1, slots=512):
+        self.tick = tick # resolution (secs)
+        self._loop = loop
+        self._slots = [{} for i in range(slots)]
+        self._count = 0
+        self._current = None # the last tick that was run
+        self._ticker = None
+        self._armed = None # the tick that _ticker is for
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, delta, callback, *args):
+        """
+        Schedule callable callback to be run in delta seconds (rounded up to
+        the next tick) with *args. Returns a Timer.
+        """
+        now = self._loop._monotime()
+        if self._current is None:
+            self._current = int(now // self.tick)
+        timer = Timer(self, None, callback, args)
+        self._place(timer, now + delta)
+        self._count += 1
+        if self._ticker is None:
+            self._arm()
+        return timer
+
+    def _place(self, timer, when):
+        "Put timer in the slot for the first tick at or after when."
+        tick = max(-int(-when // self.tick), self._current + 1)
+        timer._when = tick * self.tick
+        self._slots[tick % len(self._slots)][timer] = True
+        if self._ticker is not None and tick < self._armed:
+            self._arm(tick)
+
+    def clear(self):
+        "Remove all pending timeouts."
+        for slot in self._slots:
+            for timer in slot:
+                timer._callback = timer._args = None
+            slot.clear()
+        self._count = 0
+        self._current = None
+        if self._ticker:
+            self._ticker.delete()
+            self._ticker = self._armed = None
+
+    def _tick_of(self, timer):
+        return int(round(timer._when / self.tick))
+
+    def _timer_deleted(self, timer):
+        slot = self._slots[self._tick_of(timer) % len(self._slots)]
+        if slot.pop(timer, None):
+            self._count -= 1
+            if self._count == 0 and self._ticker:
+                self._ticker.delete()
+                self._ticker = self._armed = None
+
+    def _timer_reset(self, timer, delay):
+        slot = self._slots[self._tick_of(timer) % len(self._slots)]
+        if slot.pop(timer, None) is None: # due, but not run yet
+            self._count += 1
+        self._place(timer, self._loop._monotime() + delay)
+
+    def _arm(self, tick=None):
+        """
+        Arrange for _advance to run at tick; by default, the first one that
+        has a timeout, so that the loop isn't woken for empty ones.
+        """
+        if tick is None:
+            tick = self._next_tick()
+        if self._ticker is not None:
+            self._ticker.delete()
+        self._armed = tick
+        self._ticker = self._loop.schedule(
+            max(tick * self.tick - self._loop._monotime(), 0), self._advance
+        )
+
+    def _next_tick(self):
+        """
+        Return the first tick after the current one with a timeout due; if
+        they're all more than a revolution away, the tick a revolution on.
+        """
+        slots = self._slots
+        for tick in range(self._current + 1, self._current + len(slots) + 1):
+            slot = slots[tick % len(slots)]
+            if slot:
+                for timer in slot:
+                    if self._tick_of(timer) == tick:
+                        return tick
+        return self._current + len(slots)
+
+    def _advance(self):
+        "Run the timeouts that are due."
+        self._ticker = self._armed = None
+        now = self._loop._monotime()
+        target = int(now // self.tick)
+        slots = self._slots
+        due = []
+        last = min(target, self._current + len(slots))
+        for tick in range(self._current + 1, last + 1):
+            slot = slots[tick % len(slots)]
+            if slot:
+                for timer in [t for t in slot if self._tick_of(t) <= target]:
+                    del slot[timer]
+                    due.append(timer)
+        self._current = target
+        self._count -= len(due)
+        stats = self._loop.stats
+        profiler = self._loop.profiler
+        for timer in due:
+            callback = timer._callback
+            if callback is None: # deleted by an earlier timeout
+                continue
+            if timer._when > now: # reset by an earlier timeout
+                continue
+            args = timer._args
+            timer._callback = timer._args = None
+            stats.timers_fired += 1
+            if profiler is None:
+                callback(*args)
+            else:
+                profiler.call(callback, args, 'schedule_timeout')
+        if self._count and self._ticker is None:
+            self._arm()
+
+
+class Waker(EventSource):
+    """
+    Wakes the loop up from other threads, and runs the callbacks they
+    have passed to LoopBase.call_threadsafe on the loop's thread.
+
+    Uses an eventfd where available, and a pipe otherwise.
+    """
+    _edge_triggered = True
+
+    def __init__(self, loop):
+        EventSource.__init__(self, loop)
+        self.callbacks = deque() # appending is thread-safe
+        self._pending = False # whether a wakeup is already on its way
+        if hasattr(os, 'eventfd'):
+            self._r_fd = self._w_fd = os.eventfd(
+                0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        else:
+            self._r_fd, self._w_fd = os.pipe()
+            for fd in self._r_fd, self._w_fd:
+                os.set_blocking(fd, False)
+        self.register()
+
+    def register(self):
+        "Register with the loop, if not already."
+        if self._fd is None:
+            self.register_fd(self._r_fd, 'readable',
+                             on_readable=self.handle_read)
+
+    def wake(self):
+        "Make the loop run pending callbacks. Can be called from any thread."
+        if self._pending:
+            return
+        self._pending = True
+        try:
+            if self._r_fd == self._w_fd:
+                os.eventfd_write(self._w_fd, 1)
+            else:
+                os.write(self._w_fd, b'\0')
+        except BlockingIOError:
+            pass # it's full, so the loop will wake anyway.
+
+    def handle_read(self):
+        try:
+            while os.read(self._r_fd, 4096):
+                if self._r_fd == self._w_fd:
+                    break # an eventfd is reset by a single read
+        except BlockingIOError:
+            pass
+        # only once the fd is drained; a wake() from here on writes to it
+        # again, and callbacks queued before that are run below.
+        self._pending = False
+        callbacks = self.callbacks
+        profiler = self._loop.profiler
+        for i in range(len(callbacks)):
+            callback, args = callbacks.popleft()
+            if profiler is None:
+                callback(*args)
+            else:
+                profiler.call(callback, args, 'call_threadsafe')
+
+    def close(self):
+        "Stop waking the loop, and release the fds."
+        self.unregister_fd()
+        os.close(self._r_fd)
+        if self._w_fd != self._r_fd:
+            os.close(self._w_fd)
+
+
+class Job(EventEmitter):
+    """
+    A call made in a LoopBase's thread pool, as returned by
+    run_in_executor.
+
+    Emits (on the loop's thread):
+     - done (result): the call returned result
+     - error (exc): the call raised exc
+    """
+
+    def __init__(self, future):
+        EventEmitter.__init__(self)
+        self.future = future
+
+    def cancel(self):
+        """
+        Cancel the call, if it hasn't started yet. Returns True if it was
+        cancelled, in which case no events will be emitted.
+        """
+        return self.future.cancel()
+
+    def _finished(self):
+        if self.future.cancelled():
+            return
+        exc = self.future.exception()
+        if exc is None:
+            self.emit('done', self.future.result())
+        else:
+            self.emit('error', exc)
+
+
+class Histogram(object):
+    """
+    A histogram of durations, with buckets that double in size from one
+    microsecond; bucket n counts durations of less than 2 ** n usecs.
+    Adding a duration is cheap, and the memory used is fixed.
+    """
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self, size=32):
+        self.buckets = array('L', [0] * size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, secs):
+        "Count a duration of secs seconds."
+        bucket = int(secs * 1000000).bit_length()
+        try:
+            self.buckets[bucket] += 1
+        except IndexError:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total += secs
+        if secs > self.max:
+            self.max = secs
+
+    def percentile(self, fraction):
+        """
+        Return the upper bound of the bucket holding the given fraction of
+        durations (e.g., .99), in seconds.
+        """
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min(2 ** bucket / 1000000, self.max)
+        return 0.0
+
+    def clear(self):
+        "Forget all durations."
+        for i in range(len(self.buckets)):
+            self.buckets[i] = 0
+        self.count = 0
+        self.total = self.max = 0.0
+
+    def summary(self):
+        "Return a dict summarising the durations, in seconds."
+        return {
+            'count': self.count,
+            'total': self.total,
+            'p50': self.percentile(.5),
+            'p99': self.percentile(.99),
+            'max': self.max,
+            'buckets': self.buckets.tolist()
+        }
+
+
+class LoopStats(object):
+    """
+    Counters kept by a running loop; see LoopBase.get_stats.
+    """
+    __slots__ = ('iterations', 'poll_time', 'callback_time', 'fd_events',
+                 'timers_fired', 'slow_iterations', 'lag', 'callbacks')
+
+    def __init__(self):
+        self.iterations = 0
+        self.poll_time = 0.0 # seconds spent waiting for fd events
+        self.callback_time = 0.0 # seconds spent running callbacks
+        self.fd_events = 0 # fds returned by polling
+        self.timers_fired = 0
+        self.slow_iterations = 0 # callbacks ran longer than precision
+        self.lag = Histogram() # how late scheduled events ran
+        self.callbacks = Histogram() # time spent in callbacks per iteration
+
+    def clear(self):
+        "Reset the counters."
+        self.__init__()
+
+
 class LoopBase(EventEmitter):
     """
     Base class for async loops.
     """
     _event_types = {} # map of event types to names; override.
+    edge_triggered = False # whether edge-capable fds get edge events
+    executor_workers = 8 # maximum threads used by run_in_executor
+    idle_slice = None # seconds of call_idle callbacks per busy iteration
 
     def __init__(self, precision=None):
         EventEmitter.__init__(self)
-        self.precision = precision or .5 # of running scheduled queue (secs)
+        self.precision = precision or .5 # for debug warnings (secs)
         self.running = False # whether or not the loop is running (read-only)
-        self.__sched_events = []
+        self.__sched_events = [] # heap of (deadline, seq, Timer)
+        self.__sched_seq = 0 # tie-breaker for identical deadlines
+        self.__sched_cancelled = 0 # deleted timers still in the heap
+        self._wheel = TimingWheel(self)
+        self.__ready = ReadyQueue()
+        self.__idle = ReadyQueue()
+        self.__before_poll = ReadyQueue()
+        self.__polled_events = 0 # fd events returned by the last poll
         self._fd_targets = {}
+        self._fd_dispatch = [] # fd: (target, readable, writable, hangup)
+        self._fd_masks = {} # fd: event mask registered with the system
+        self._fd_dirty = set() # fds whose mask may need updating
+        self.fd_mask_changes = 0 # event_add / event_del calls
+        self.fd_mask_syscalls = 0 # system calls made for them
+        self._waker = None
+        self._read_buffer = None # shared by TcpConnections; see thor.tcp
+        self._waker_lock = threading.Lock()
+        self._executor = None
+        self.stats = LoopStats()
+        self.profiler = None # see thor.profiler
+        self.tracer = None # see thor.tracer
+        # when the current iteration's callbacks started (monotonic), or
+        # None while polling; read by Watchdog.
+        self.heartbeat = None
+        self._thread_ident = None # the thread running the loop
+        self.__poll_start = self.__busy_start = systime.monotonic()
         self.__now = None
+        self.__mono = None
         self._eventlookup = dict(
             [(v,k) for (k,v) in self._event_types.items()]
         )
@@ -104,67 +536,245 @@ class LoopBase(EventEmitter):
     def run(self):
         "Start the loop."
         self.running = True
-        last_event_check = 0
-        self.__now = systime.time()
+        self._thread_ident = threading.get_ident()
+        # other threads can't register fds safely once we're polling.
+        self._get_waker().register()
+        self._update_time()
+        self.__poll_start = self.__busy_start = self.heartbeat = \
+          systime.monotonic()
         self.emit('start')
+        stats = self.stats
         while self.running:
-            if debug:
-                fd_start = systime.time()
-            self._run_fd_events()
-            self.__now = systime.time()
-            if debug:
-                delay = self.__now - fd_start
-                if delay >= self.precision * 1.5:
-                    sys.stderr.write(
-                     "WARNING: long fd delay (%.2f)\n" % delay
-                    )
-            # find scheduled events
+            if self.__ready:
+                self._run_ready()
+                if not self.running:
+                    break
+            if self.__before_poll:
+                self._run_before_poll()
+                if not self.running:
+                    break
+            now = systime.monotonic()
+            busy = now - self.__busy_start
+            stats.iterations += 1
+            stats.callback_time += busy
+            stats.callbacks.add(busy)
+            if busy > self.precision:
+                self._slow_iteration(busy)
+            if self.tracer is not None:
+                self.tracer.loop_span('callbacks', self.__busy_start, now)
+                self.tracer.loop_span('iteration', self.__poll_start, now)
+            self.__poll_start = self.__busy_start = now
+            self.heartbeat = None
+            if self.__ready or self.__idle:
+                self._run_fd_events(0)
+            else:
+                self._run_fd_events(self._poll_timeout())
+            self._update_time()
             if not self.running:
                 break
-            delay = self.__now - last_event_check
-            if delay >= self.precision * 0.90:
-                if debug:
-                    if last_event_check and (delay >= self.precision * 4):
-                        sys.stderr.write(
-                          "WARNING: long loop delay (%.2f)\n" % delay
-                        )
-                    if len(self.__sched_events) > 5000:
-                        sys.stderr.write(
-                          "WARNING: %i events scheduled\n" % \
-                            len(self.__sched_events))
-                last_event_check = self.__now
-                for event in self.__sched_events:
-                    when, what = event
-                    if self.__now >= when:
-                        try:
-                            self.__sched_events.remove(event)
-                        except ValueError:
-                            # a previous event may have removed this one.
-                            continue
-                        if debug:
-                            ev_start = systime.time()
-                        what()
-                        if debug:
-                            delay = systime.time() - ev_start
-                            if delay > self.precision * 2:
-                                sys.stderr.write(
-                        "WARNING: long event delay (%.2f): %s\n" % \
-                                (delay, repr(what)) 
-                                )
-                    else:
-                        break
-
-    def _run_fd_events(self):
-        "Run loop-specific FD events."
+            self._run_timers()
+            if self.__idle:
+                if self.__polled_events == 0:
+                    self._run_idle()
+                elif self.idle_slice is not None:
+                    self._run_idle(systime.monotonic() + self.idle_slice)
+
+    def _poll_timeout(self):
+        """
+        Return how long to wait for fd events; i.e., until the next
+        scheduled event is due, or None if there aren't any.
+        """
+        events = self.__sched_events
+        while events:
+            when, seq, timer = events[0]
+            if seq != timer._seq or timer._callback is None:
+                heappop(events) # deleted, or reset to an earlier deadline
+                self.__sched_cancelled -= 1
+            elif timer._when > when: # reset to a later deadline
+                timer._seq = self.__sched_seq
+                heapreplace(events, (timer._when, timer._seq, timer))
+                self.__sched_seq += 1
+            else:
+                return max(when - systime.monotonic(), 0)
+        return None
+
+    def _polled(self, events):
+        """
+        Note that polling has returned events fds. Called by _run_fd_events
+        before it runs any callbacks.
+        """
+        now = systime.monotonic()
+        self.stats.poll_time += now - self.__poll_start
+        self.stats.fd_events += events
+        self.__polled_events = events
+        if self.tracer is not None:
+            self.tracer.loop_span('poll', self.__poll_start, now)
+        self.__busy_start = self.heartbeat = now
+
+    def _slow_iteration(self, busy):
+        "An iteration's callbacks ran for busy seconds; more than precision."
+        self.stats.slow_iterations += 1
+        if debug:
+            sys.stderr.write(
+                "WARNING: loop blocked by callbacks for %.2fs\n" % busy)
+
+    def get_stats(self):
+        """
+        Return a dict of the loop's statistics; times are in seconds. See
+        LoopStats.
+        """
+        stats = self.stats
+        return {
+            'iterations': stats.iterations,
+            'poll_time': stats.poll_time,
+            'callback_time': stats.callback_time,
+            'fd_events': stats.fd_events,
+            'timers_fired': stats.timers_fired,
+            'timers_pending': self.timer_count(),
+            'slow_iterations': stats.slow_iterations,
+            'lag': stats.lag.summary(),
+            'callbacks': stats.callbacks.summary()
+        }
+
+    def _update_time(self):
+        "Refresh the cached clocks."
+        self.__now = systime.time()
+        self.__mono = systime.monotonic()
+
+    def _monotime(self):
+        "Return the current monotonic time, for deadlines."
+        return self.__mono or systime.monotonic()
+
+    def _run_ready(self):
+        """
+        Run the callbacks queued by call_soon. Callbacks queued while doing
+        so are left for the next iteration.
+        """
+        ready = self.__ready
+        profiler = self.profiler
+        for i in range(len(ready)):
+            if not ready: # stopped
+                break
+            timer = ready.popleft()
+            callback = timer._callback
+            if callback is None: # deleted
+                continue
+            args = timer._args
+            timer._callback = timer._args = None
+            if profiler is None:
+                callback(*args)
+            else:
+                profiler.call(callback, args, 'call_soon')
+
+    def _run_before_poll(self):
+        """
+        Run the callbacks queued by call_before_poll, including any they
+        queue.
+        """
+        queue = self.__before_poll
+        profiler = self.profiler
+        while queue:
+            timer = queue.popleft()
+            callback = timer._callback
+            if callback is None: # deleted
+                continue
+            args = timer._args
+            timer._callback = timer._args = None
+            if profiler is None:
+                callback(*args)
+            else:
+                profiler.call(callback, args, 'call_before_poll')
+
+    def _run_idle(self, deadline=None):
+        """
+        Run the callbacks queued by call_idle, until the monotonic time
+        deadline, if given. Callbacks queued while doing so are left for the
+        next idle iteration.
+        """
+        idle = self.__idle
+        profiler = self.profiler
+        for i in range(len(idle)):
+            if not idle or deadline is not None and \
+              systime.monotonic() >= deadline:
+                break
+            timer = idle.popleft()
+            callback = timer._callback
+            if callback is None: # deleted
+                continue
+            args = timer._args
+            timer._callback = timer._args = None
+            if profiler is None:
+                callback(*args)
+            else:
+                profiler.call(callback, args, 'call_idle')
+
+    def _run_timers(self):
+        """
+        Run the scheduled events whose deadline has passed. Events scheduled
+        while doing so are left for the next pass, even if they're due.
+        """
+        events = self.__sched_events
+        now = self._monotime()
+        last_seq = self.__sched_seq
+        stats = self.stats
+        profiler = self.profiler
+        while events:
+            when, seq, timer = events[0]
+            if when > now or seq >= last_seq:
+                break
+            callback = timer._callback
+            if seq != timer._seq or callback is None: # drop it lazily
+                heappop(events)
+                self.__sched_cancelled -= 1
+                continue
+            if timer._when > now: # reset to a later deadline
+                timer._seq = self.__sched_seq
+                heapreplace(events, (timer._when, timer._seq, timer))
+                self.__sched_seq += 1
+                continue
+            args = timer._args
+            interval = timer._interval
+            if interval is None:
+                heappop(events)
+                timer._callback = timer._args = None
+            else: # run it again; if we've fallen behind, skip the backlog
+                timer._when = when + interval
+                if timer._when <= now:
+                    timer._when = now + interval
+                timer._seq = self.__sched_seq
+                heapreplace(events, (timer._when, timer._seq, timer))
+                self.__sched_seq += 1
+            stats.timers_fired += 1
+            stats.lag.add(now - when)
+            if profiler is None:
+                callback(*args)
+            else:
+                profiler.call(callback, args, 'schedule')
+
+    def _run_fd_events(self, timeout=0):
+        """
+        Wait up to timeout seconds (forever if None) for FD events, and
+        run them.
+        """
         raise NotImplementedError
 
     def stop(self):
         "Stop the loop and unregister all fds."
-        self.__sched_events = []
+        for when, seq, timer in self.__sched_events:
+            timer._callback = timer._args = None
+        del self.__sched_events[:]
+        self.__sched_cancelled = 0
+        self._wheel.clear()
+        for queue in self.__ready, self.__idle, self.__before_poll:
+            for timer in queue:
+                timer._callback = timer._args = None
+            queue.clear()
         self.__now = None
+        self.__mono = None
         self.running = False
-        for fd in self._fd_targets.keys():
-            self.unregister_fd(fd)
+        self.heartbeat = None
+        for target in list(self._fd_targets.values()):
+            target.unregister_fd()
         self.emit('stop')
 
     def register_fd(self, fd, events, target):
@@ -187,12 +797,81 @@ class LoopBase(EventEmitter):
         "Stop emitting event for fd"
         raise NotImplementedError
 
+    def _fd_changed(self, fd):
+        """
+        Note that the events of interest for fd have changed. The change is
+        made just before the next poll, if it's still needed by then.
+        """
+        self.fd_mask_changes += 1
+        self._fd_dirty.add(fd)
+
+    def _flush_fd_changes(self):
+        "Apply pending event mask changes."
+        for fd in self._fd_dirty:
+            try:
+                target = self._fd_targets[fd]
+            except KeyError:
+                continue # unregistered since
+            eventmask = self._eventmask(target._interesting_events)
+            if eventmask != self._fd_masks.get(fd, None):
+                self.fd_mask_syscalls += 1
+                try:
+                    self._set_fd_mask(fd, eventmask)
+                except OSError as why:
+                    if why.errno not in [errno.EBADF, errno.ENOENT]:
+                        raise
+                    continue # closed without being unregistered
+                self._fd_masks[fd] = eventmask
+        self._fd_dirty.clear()
+
+    def _set_fd_mask(self, fd, eventmask):
+        "Set the event mask for a registered fd."
+        raise NotImplementedError
+
     def _fd_event(self, event, fd):
         "An event has occured on an fd."
-        if fd in self._fd_targets:
-            self._fd_targets[fd].emit(event)
+        entry = self._dispatch_entry(fd)
+        if entry is not None:
+            slot = self._dispatch_slots.get(event, None)
+            if slot is None:
+                entry[0].emit(event)
+            else:
+                entry[slot]()
         # TODO: automatic unregister on 'close'?
 
+    _dispatch_slots = {'readable': 1, 'writable': 2, 'close': 3}
+
+    def _dispatch_add(self, fd, target):
+        """
+        Put target's handlers in the dispatch table for fd, so that
+        _run_fd_events can find them with a single index. Events without
+        a handler are emitted.
+        """
+        handlers = target._fd_handlers or (None, None, None)
+        entry = [target]
+        for handler, event in zip(handlers, ('readable', 'writable', 'close')):
+            handler = handler or partial(target.emit, event)
+            if self.profiler is not None:
+                handler = self.profiler.wrap(
+                    handler, target.__class__.__name__, event)
+            entry.append(handler)
+        dispatch = self._fd_dispatch
+        if fd >= len(dispatch):
+            dispatch.extend([None] * (fd + 1 - len(dispatch)))
+        dispatch[fd] = tuple(entry)
+
+    def _dispatch_del(self, fd):
+        "Remove fd from the dispatch table."
+        if fd < len(self._fd_dispatch):
+            self._fd_dispatch[fd] = None
+
+    def _dispatch_entry(self, fd):
+        "Return the dispatch table entry for fd, or None."
+        try:
+            return self._fd_dispatch[fd]
+        except IndexError:
+            return None
+
     def time(self):
         "Return the current time (to avoid a system call)."
         return self.__now or systime.time()
@@ -204,28 +883,154 @@ class LoopBase(EventEmitter):
         Returns an object which can be used to later remove the event, by
         calling its delete() method.
         """
-        def cb():
-            if callback:
-                callback(*args)
-        cb.__name__ = callback.__name__
-        new_event = (self.time() + delta, cb)
+        when = self._monotime() + delta
+        timer = Timer(self, when, callback, args)
+        timer._seq = self.__sched_seq
+        heappush(self.__sched_events, (when, timer._seq, timer))
+        self.__sched_seq += 1
+        return timer
+
+    def schedule_interval(self, interval, callback, *args):
+        """
+        Schedule callable callback to be run every interval seconds with
+        *args, starting interval seconds from now. If the loop falls behind,
+        missed runs are skipped rather than run back-to-back.
+
+        Returns an object whose delete() method stops it from running again.
+        """
+        timer = self.schedule(interval, callback, *args)
+        timer._interval = interval
+        return timer
+
+    def call_soon(self, callback, *args):
+        """
+        Run callable callback with *args on the next loop iteration, before
+        waiting for fd events. Callbacks run in the order they were added.
+
+        Returns an object which can be used to later remove the callback,
+        by calling its delete() method.
+        """
+        timer = Timer(self.__ready, None, callback, args)
+        self.__ready.append(timer)
+        return timer
+
+    def call_before_poll(self, callback, *args):
+        """
+        Run callable callback with *args at the end of the current loop
+        iteration, after everything else that's due and just before the
+        loop waits for fd events. Callbacks run in the order they were
+        added.
+
+        Use this to batch up work done by several callbacks in the same
+        iteration; e.g., TcpConnection uses it to send everything written
+        to a connection in one system call.
+
+        Returns an object which can be used to later remove the callback,
+        by calling its delete() method.
+        """
+        timer = Timer(self.__before_poll, None, callback, args)
+        self.__before_poll.append(timer)
+        return timer
+
+    def call_idle(self, callback, *args):
+        """
+        Run callable callback with *args when the loop has spare capacity;
+        i.e., after an iteration where polling found no fd events. If
+        idle_slice is set, up to that many seconds of them also run on
+        busy iterations. Callbacks run in the order they were added.
+
+        Use this for housekeeping that shouldn't compete with I/O; e.g.,
+        sweeping caches or flushing statistics.
+
+        Returns an object which can be used to later remove the callback,
+        by calling its delete() method.
+        """
+        timer = Timer(self.__idle, None, callback, args)
+        self.__idle.append(timer)
+        return timer
+
+    def call_threadsafe(self, callback, *args):
+        """
+        Run callable callback with *args on the loop's thread, as soon as
+        possible. Unlike the other scheduling methods, this can be called
+        from any thread; callbacks run in the order they were added.
+        """
+        waker = self._get_waker()
+        waker.callbacks.append((callback, args))
+        waker.wake()
+
+    def _get_waker(self):
+        "Return the loop's Waker, creating it if necessary."
+        if self._waker is None:
+            with self._waker_lock:
+                if self._waker is None:
+                    self._waker = Waker(self)
+        return self._waker
+
+    def run_in_executor(self, fn, *args):
+        """
+        Call fn with *args in a thread pool, so that it can block without
+        blocking the loop. At most executor_workers calls run at once; the
+        rest wait their turn.
+
+        Returns a Job, which emits 'done' with fn's return value, or 'error'
+        with the exception it raised, on the loop's thread.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.executor_workers)
+        job = Job(self._executor.submit(fn, *args))
+        job.future.add_done_callback(
+            lambda future: self.call_threadsafe(job._finished))
+        return job
+
+    def schedule_timeout(self, delta, callback, *args):
+        """
+        Schedule callable callback to be run in delta seconds with *args,
+        with a resolution of self._wheel.tick seconds.
+
+        This is much cheaper than schedule() for large numbers of timeouts
+        that will usually be deleted before they run.
+
+        Returns an object which can be used to later remove the event, by
+        calling its delete() method.
+        """
+        return self._wheel.schedule(delta, callback, *args)
+
+    def timer_count(self):
+        "Return how many scheduled events are pending."
+        count = len(self.__sched_events) - self.__sched_cancelled
+        if self._wheel._ticker:
+            count -= 1
+        return count + len(self._wheel)
+
+    def _timer_deleted(self, timer):
+        """
+        A pending timer has been deleted. It stays in the heap until it
+        would have run, unless deleted timers come to dominate the heap.
+        """
+        self.__sched_cancelled += 1
         events = self.__sched_events
-        try: 
-            bisect.insort(events, new_event) # FIXME: error when events with identical timestamps
-        except TypeError:
-            events.append(new_event)
-            events.sort(key=lambda x:x[0])
-        class event_holder:
-            def __init__(self):
-                self._deleted = False
-            def delete(self):
-                if not self._deleted:
-                    try:
-                        events.remove(new_event)
-                        self._deleted = True
-                    except ValueError: # already gone
-                        pass
-        return event_holder()
+        if self.__sched_cancelled > 64 and \
+          self.__sched_cancelled * 2 > len(events):
+            events[:] = [(e[2]._when, e[1], e[2]) for e in events
+                         if e[1] == e[2]._seq and e[2]._callback is not None]
+            heapify(events)
+            self.__sched_cancelled = 0
+
+    def _timer_reset(self, timer, delay):
+        """
+        A pending timer's deadline has moved. If it's later, the heap entry
+        is left in place and moved when it comes up; otherwise, a new entry
+        is added and the old one is dropped lazily, like a deleted timer.
+        """
+        when = self._monotime() + delay
+        earlier = when < timer._when
+        timer._when = when
+        if earlier:
+            timer._seq = self.__sched_seq
+            heappush(self.__sched_events, (when, timer._seq, timer))
+            self.__sched_seq += 1
+            self._timer_deleted(timer)
 
     def _eventmask(self, events):
         "Calculate the mask for a list of events."
@@ -264,34 +1069,64 @@ class PollLoop(LoopBase):
         # pylint: enable=E1101
 
     def register_fd(self, fd, events, target):
+        eventmask = self._eventmask(events)
         self._fd_targets[fd] = target
-        self._poll.register(fd, self._eventmask(events))
+        self._fd_masks[fd] = eventmask
+        self._dispatch_add(fd, target)
+        self._poll.register(fd, eventmask)
 
     def unregister_fd(self, fd):
         self._poll.unregister(fd)
         del self._fd_targets[fd]
+        del self._fd_masks[fd]
+        self._fd_dirty.discard(fd)
+        self._dispatch_del(fd)
 
     def event_add(self, fd, event):
-        eventmask = self._eventmask(self._fd_targets[fd]._interesting_events)
-        self._poll.register(fd, eventmask)
+        self._fd_changed(fd)
 
     def event_del(self, fd, event):
-        eventmask = self._eventmask(self._fd_targets[fd]._interesting_events)
-        self._poll.register(fd, eventmask)
+        self._fd_changed(fd)
+
+    def _set_fd_mask(self, fd, eventmask):
+        self._poll.modify(fd, eventmask)
 
-    def _run_fd_events(self):
-        event_list = self._poll.poll(self.precision)
+    def _run_fd_events(self, timeout=0):
+        if self._fd_dirty:
+            self._flush_fd_changes()
+        if timeout is not None:
+            timeout = int(math.ceil(timeout * 1000)) # poll() wants msecs
+        event_list = self._poll.poll(timeout)
+        self._polled(len(event_list))
+        dispatch = self._fd_dispatch
+        # pylint: disable=E1101
         for fileno, eventmask in event_list:
-            for event in self._filter2events(eventmask):
-                self._fd_event(event, fileno)
+            entry = dispatch[fileno]
+            if entry is None:
+                continue # unregistered since the poll
+            if eventmask & select.POLLIN:
+                entry[1]()
+            # earlier handlers may have unregistered the fd.
+            if eventmask & select.POLLOUT and dispatch[fileno] is entry:
+                entry[2]()
+            if eventmask & select.POLLERR and dispatch[fileno] is entry:
+                entry[0].emit('error')
+            if eventmask & select.POLLHUP and dispatch[fileno] is entry:
+                entry[3]()
+        # pylint: enable=E1101
 
 
 class EpollLoop(LoopBase):
     """
     An epoll()-based async loop.
+
+    If edge_triggered is True, fds whose EventSource is marked as
+    _edge_triggered are registered for all events once, using EPOLLET;
+    adding and removing their events doesn't make a system call.
     """
+    _edge_events = frozenset(['readable', 'writable'])
 
-    def __init__(self, *args):
+    def __init__(self, precision=None, edge_triggered=False):
         # pylint: disable=E1101
         self._event_types = {
             select.EPOLLIN: 'readable',
@@ -299,40 +1134,96 @@ class EpollLoop(LoopBase):
             select.EPOLLHUP: 'close',
             select.EPOLLERR: 'error'
         }
-        LoopBase.__init__(self, *args)
+        LoopBase.__init__(self, precision)
+        self.edge_triggered = edge_triggered
         self._epoll = select.epoll()
+        self._edge_fds = set()
+        self._edge_mask = select.EPOLLIN | select.EPOLLOUT | select.EPOLLET
         # pylint: enable=E1101
 
     def register_fd(self, fd, events, target):
+        if self.edge_triggered and target._edge_triggered:
+            if fd in self._fd_targets:
+                self.unregister_fd(fd)
+            self._fd_targets[fd] = target
+            self._edge_fds.add(fd)
+            self._dispatch_add(fd, target)
+            self._epoll.register(fd, self._edge_mask)
+            for event in events:
+                self.event_add(fd, event)
+            return
         eventmask = self._eventmask(events)
         if fd in self._fd_targets:
             self._epoll.modify(fd, eventmask)
         else:
             self._fd_targets[fd] = target
             self._epoll.register(fd, eventmask)
+        self._fd_masks[fd] = eventmask
+        self._dispatch_add(fd, target)
 
     def unregister_fd(self, fd):
         self._epoll.unregister(fd)
         del self._fd_targets[fd]
+        self._fd_masks.pop(fd, None)
+        self._fd_dirty.discard(fd)
+        self._edge_fds.discard(fd)
+        self._dispatch_del(fd)
 
     def event_add(self, fd, event):
-        eventmask = self._eventmask(self._fd_targets[fd]._interesting_events)
-        self._epoll.modify(fd, eventmask)
+        if fd in self._edge_fds:
+            # the edge may have passed while we weren't interested.
+            if event in self._edge_events:
+                self.call_soon(
+                    self._edge_event, event, fd, self._fd_targets[fd]
+                )
+            return
+        self._fd_changed(fd)
 
     def event_del(self, fd, event):
-        try:
-            eventmask = self._eventmask(
-                self._fd_targets[fd]._interesting_events
-            )
-        except KeyError:
-            return # no longer interested
+        if fd in self._edge_fds:
+            return
+        self._fd_changed(fd)
+
+    def _set_fd_mask(self, fd, eventmask):
         self._epoll.modify(fd, eventmask)
 
-    def _run_fd_events(self):
-        event_list = self._epoll.poll(self.precision)
+    def _edge_event(self, event, fd, target):
+        "Deliver event on an edge-triggered fd, if target still wants it."
+        entry = self._dispatch_entry(fd)
+        if entry is None or entry[0] is not target:
+            return # unregistered since
+        if event in target._interesting_events:
+            entry[self._dispatch_slots[event]]()
+
+    def _run_fd_events(self, timeout=0):
+        if self._fd_dirty:
+            self._flush_fd_changes()
+        event_list = self._epoll.poll(timeout)
+        self._polled(len(event_list))
+        dispatch = self._fd_dispatch
+        edge_fds = self._edge_fds
+        # pylint: disable=E1101
         for fileno, eventmask in event_list:
-            for event in self._filter2events(eventmask):
-                self._fd_event(event, fileno)
+            entry = dispatch[fileno]
+            if entry is None:
+                continue # unregistered since the poll
+            readable = eventmask & select.EPOLLIN
+            writable = eventmask & select.EPOLLOUT
+            if fileno in edge_fds:
+                # edge fds get every event; only deliver the wanted ones.
+                interesting = entry[0]._interesting_events
+                readable = readable and 'readable' in interesting
+                writable = writable and 'writable' in interesting
+            if readable:
+                entry[1]()
+            # earlier handlers may have unregistered the fd.
+            if writable and dispatch[fileno] is entry:
+                entry[2]()
+            if eventmask & select.EPOLLERR and dispatch[fileno] is entry:
+                entry[0].emit('error')
+            if eventmask & select.EPOLLHUP and dispatch[fileno] is entry:
+                entry[3]()
+        # pylint: enable=E1101
 
 
 class KqueueLoop(LoopBase):
@@ -352,6 +1243,7 @@ class KqueueLoop(LoopBase):
 
     def register_fd(self, fd, events, target):
         self._fd_targets[fd] = target
+        self._dispatch_add(fd, target)
         for event in events:
             self.event_add(fd, event)
 
@@ -363,6 +1255,7 @@ class KqueueLoop(LoopBase):
         for event in list(obj._interesting_events):
             obj.event_del(event)
         del self._fd_targets[fd]
+        self._dispatch_del(fd)
 
     def event_add(self, fd, event):
         eventmask = self._eventmask([event])
@@ -378,8 +1271,9 @@ class KqueueLoop(LoopBase):
             ev = select.kevent(fd, eventmask, select.KQ_EV_DELETE)
             self._kq.control([ev], 0, 0)
 
-    def _run_fd_events(self):
-        events = self._kq.control([], self.max_ev, self.precision)
+    def _run_fd_events(self, timeout=0):
+        events = self._kq.control([], self.max_ev, timeout)
+        self._polled(len(events))
         for e in events:
             event_types = self._filter2events(e.filter)
             for event_type in event_types:
@@ -397,16 +1291,187 @@ class KqueueLoop(LoopBase):
     		#	buffer.
 
 
-def make(precision=None):
+class AsyncioLoop(LoopBase):
+    """
+    A loop that runs on top of an asyncio event loop, so that Thor can
+    share a thread with asyncio code (or use a faster asyncio-compatible
+    loop).
+
+    fd events come from the asyncio loop's add_reader and add_writer, and
+    Thor's scheduled events and call_soon callbacks are run by a single
+    asyncio callback, armed with call_at or call_soon.
+
+    If the asyncio loop is already running, run() just starts Thor's
+    timers and returns; otherwise, it runs the asyncio loop until stop()
+    is called. If it isn't given an asyncio loop, it creates one when
+    first needed, and closes it when run() returns.
+
+    It can't tell when the asyncio loop is idle or about to poll, so
+    call_idle and call_before_poll callbacks run like call_soon ones.
+    """
+
+    def __init__(self, precision=None, aio_loop=None):
+        LoopBase.__init__(self, precision)
+        self._aio = aio_loop # if None, _open() creates one
+        self._aio_owned = aio_loop is None # if so, run() closes it
+        self._aio_running = False # whether run() is running self._aio
+        self._aio_soon = None # handle for running call_soon callbacks
+        self._aio_timer = None # handle for the next scheduled event
+        self._aio_timer_when = None
+
+    def run(self):
+        self._open()
+        self.running = True
+        self._update_time()
+        self.emit('start')
+        self._iterate()
+        if self.running and not self._aio.is_running():
+            self._aio_running = True
+            try:
+                self._aio.run_forever()
+            finally:
+                self._aio_running = False
+        if self._aio_owned and not self._aio.is_running():
+            self._aio.close()
+
+    def stop(self):
+        LoopBase.stop(self)
+        for handle in self._aio_soon, self._aio_timer:
+            if handle is not None:
+                handle.cancel()
+        self._aio_soon = self._aio_timer = self._aio_timer_when = None
+        if self._aio_running:
+            self._aio.stop()
+
+    def _open(self):
+        """
+        Create an asyncio loop to run on, if we weren't given one and don't
+        have an open one already.
+        """
+        if self._aio is None or self._aio_owned and self._aio.is_closed():
+            import asyncio
+            self._aio = asyncio.new_event_loop()
+
+    def _iterate(self):
+        "Run call_soon callbacks and due events, then wait for the next."
+        self._aio_soon = None
+        if not self.running:
+            return
+        self.stats.iterations += 1
+        self._run_ready()
+        self._update_time()
+        self._run_timers()
+        self._run_idle() # we can't tell whether asyncio is idle
+        self._run_before_poll()
+        timeout = self._poll_timeout()
+        if timeout is not None:
+            self._arm(self._monotime() + timeout)
+
+    def _arm(self, when):
+        "Make sure that _iterate runs at monotonic time when."
+        if self._aio_timer_when is not None and self._aio_timer_when <= when:
+            return
+        if self._aio_timer is not None:
+            self._aio_timer.cancel()
+        self._aio_timer_when = when
+        self._aio_timer = self._aio.call_at(
+            self._aio.time() + when - systime.monotonic(), self._timer_due)
+
+    def _timer_due(self):
+        self._aio_timer = self._aio_timer_when = None
+        self._iterate()
+
+    def schedule(self, delta, callback, *args):
+        timer = LoopBase.schedule(self, delta, callback, *args)
+        if self.running:
+            self._arm(timer._when)
+        return timer
+
+    def _timer_reset(self, timer, delay):
+        LoopBase._timer_reset(self, timer, delay)
+        if self.running:
+            self._arm(timer._when)
+
+    def call_soon(self, callback, *args):
+        timer = LoopBase.call_soon(self, callback, *args)
+        if self.running and self._aio_soon is None:
+            self._aio_soon = self._aio.call_soon(self._iterate)
+        return timer
+
+    def call_idle(self, callback, *args):
+        timer = LoopBase.call_idle(self, callback, *args)
+        if self.running and self._aio_soon is None:
+            self._aio_soon = self._aio.call_soon(self._iterate)
+        return timer
+
+    def call_before_poll(self, callback, *args):
+        timer = LoopBase.call_before_poll(self, callback, *args)
+        if self.running and self._aio_soon is None:
+            self._aio_soon = self._aio.call_soon(self._iterate)
+        return timer
+
+    def call_threadsafe(self, callback, *args):
+        self._open()
+        self._aio.call_soon_threadsafe(callback, *args)
+
+    def register_fd(self, fd, events, target):
+        self._fd_targets[fd] = target
+        self._dispatch_add(fd, target)
+        for event in events:
+            self.event_add(fd, event)
+
+    def unregister_fd(self, fd):
+        if self._aio is not None:
+            self._aio.remove_reader(fd)
+            self._aio.remove_writer(fd)
+        del self._fd_targets[fd]
+        self._dispatch_del(fd)
+
+    def event_add(self, fd, event):
+        self._open()
+        if event == 'readable':
+            self._aio.add_reader(fd, self._fd_ready, fd, 1)
+        elif event == 'writable':
+            self._aio.add_writer(fd, self._fd_ready, fd, 2)
+
+    def event_del(self, fd, event):
+        if self._aio is None:
+            return
+        if event == 'readable':
+            self._aio.remove_reader(fd)
+        elif event == 'writable':
+            self._aio.remove_writer(fd)
+
+    def _fd_ready(self, fd, slot):
+        "An fd is readable (slot 1) or writable (slot 2)."
+        entry = self._dispatch_entry(fd)
+        if entry is not None:
+            self.stats.fd_events += 1
+            self._update_time() # the asyncio loop may have been busy
+            entry[slot]()
+
+    def _run_fd_events(self, timeout=0):
+        """
+        Not used; run() leaves polling to the asyncio loop, which calls
+        _fd_ready itself. (Running the asyncio loop from here would fail if
+        it's already running.)
+        """
+        raise NotImplementedError("AsyncioLoop doesn't poll; see run()")
+
+
+def make(precision=None, edge_triggered=False):
     """
     Create and return a named loop that is suitable for the current system. If
-    _precision_ is given, it indicates how often scheduled events will be run.
+    _precision_ is given, it indicates how long a scheduled event can run
+    before a debug warning is printed. If _edge_triggered_ is True and the
+    system supports it, TCP connections and servers will use edge-triggered
+    events.
 
     Returned loop instances have all of the methods and instance variables
     that *thor.loop* has.
     """
     if hasattr(select, 'epoll'):
-        loop = EpollLoop(precision)
+        loop = EpollLoop(precision, edge_triggered)
     elif hasattr(select, 'kqueue'):
         loop = KqueueLoop(precision)
     elif hasattr(select, 'poll'):
@@ -416,6 +1481,127 @@ def make(precision=None):
         raise ImportError("What is this thing, a Windows box?")
     return loop
 
+class LoopThreads(object):
+    """
+    Runs count independent loops, each in its own thread.
+
+    setup is called with each loop, in that loop's thread and before it
+    runs; it should create everything that loop serves, passing the loop
+    to each of them (and reuse_port=True to servers, so that they can
+    share their port). Nothing should be shared between loops; use
+    call_threadsafe to talk to another loop.
+
+    > def setup(loop):
+    >     server = HttpServer(host, port, loop=loop, reuse_port=True)
+    >     server.on('exchange', handle_exchange)
+    > threads = LoopThreads(4, setup)
+    > threads.start()
+    > threads.join()
+    """
+
+    def __init__(self, count, setup, precision=None, edge_triggered=False):
+        self.loops = [make(precision, edge_triggered) for i in range(count)]
+        self.setup = setup
+        self.threads = []
+
+    def start(self):
+        "Start the loops."
+        for num, loop in enumerate(self.loops):
+            thread = threading.Thread(target=self._run, args=(loop,),
+                                      name="thor-loop-%s" % num)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _run(self, loop):
+        self.setup(loop)
+        loop.run()
+
+    def stop(self):
+        "Stop the loops. Can be called from any thread."
+        for loop in self.loops:
+            loop.call_threadsafe(loop.stop)
+
+    def join(self, timeout=None):
+        "Wait for the loops to stop."
+        for thread in self.threads:
+            thread.join(timeout)
+
+
+class Watchdog(object):
+    """
+    A thread that watches loop's heartbeat, and reports when the loop's
+    callbacks have been running for more than threshold seconds without
+    returning to poll -- while they're still running, so that the report
+    can say what they're doing.
+
+    Each stall is reported once, by calling callback (in the watchdog's
+    thread) with the loop, how many seconds it's been blocked for, and the
+    loop thread's stack as a list of strings (see traceback.format_stack).
+    By default, they're written to stderr.
+
+    > watchdog = Watchdog(loop, threshold=1)
+    > watchdog.start()
+
+    Callbacks that hold the GIL (e.g., in some C extensions) can't be seen
+    until they release it. AsyncioLoop doesn't keep a heartbeat; use
+    asyncio's debug mode instead.
+    """
+
+    def __init__(self, loop, threshold=1.0, callback=None, interval=None):
+        self.loop = loop
+        self.threshold = threshold # seconds
+        self.callback = callback or self._report
+        self.interval = interval or threshold / 4 # how often to look
+        self.stalls = 0 # how many have been reported
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        "Start watching the loop."
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch,
+                                        name="thor-watchdog")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        "Stop watching the loop."
+        if self._thread is None:
+            return
+        self._stopped.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _watch(self):
+        reported = None # heartbeat of the last stall reported
+        while not self._stopped.wait(self.interval):
+            heartbeat = self.loop.heartbeat
+            if heartbeat is None or heartbeat == reported:
+                continue
+            blocked = systime.monotonic() - heartbeat
+            if blocked < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.loop._thread_ident, None)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame)
+            del frame
+            if self.loop.heartbeat != heartbeat: # it's moved on
+                continue
+            reported = heartbeat
+            self.stalls += 1
+            self.callback(self.loop, blocked, stack)
+
+    @staticmethod
+    def _report(loop, blocked, stack):
+        sys.stderr.write("WARNING: loop blocked by callbacks for %.2fs:\n%s"
+                         % (blocked, "".join(stack)))
+
+
 _loop = make() # by default, just one big loop.
 run = _loop.run
 stop = _loop.stop
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""
+A profiler that finds the callbacks blocking a loop.
+
+While started, it times every callback the loop runs -- fd event handlers,
+EventEmitter listeners, scheduled events and timeouts -- and totals them by
+the class of the object that dispatched them, the event and the callback:
+
+> profiler = Profiler(loop)
+> profiler.start()
+> ...
+> print(profiler.report(10))
+
+Times are inclusive; e.g., an fd event handler's time includes the listeners
+it emits to.
+"""
+
+__author__ = "Mark Nottingham <mnot@mnot.net>"
+__copyright__ = """\
+Copyright (c) 2005-2013 Mark Nottingham
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from functools import partial
+import threading
+from time import perf_counter
+
+from thor.events import EventEmitter
+from thor.loop import Histogram
+
+
+_profilers = {} # loop: Profiler, for those that are started
+_plain_emit = EventEmitter.emit
+_local = threading.local() # .profiler: the last one started in this thread
+
+
+def callback_name(callback):
+    "Return a readable name for callback."
+    if isinstance(callback, partial):
+        return "%s(%s)" % (callback_name(callback.func),
+                           ", ".join([repr(a) for a in callback.args]))
+    return getattr(callback, '__qualname__', None) or repr(callback)
+
+
+class Profiler(object):
+    """
+    Times the callbacks run by loop.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.entries = {} # (source, event, callback name): Histogram
+
+    def start(self):
+        "Start timing callbacks."
+        if _profilers.get(self.loop, None) is self:
+            return
+        _profilers[self.loop] = self
+        _local.profiler = self
+        self.loop.profiler = self
+        self._redispatch()
+        EventEmitter.emit = _profiled_emit
+
+    def stop(self):
+        "Stop timing callbacks; results are kept."
+        if _profilers.get(self.loop, None) is not self:
+            return
+        del _profilers[self.loop]
+        if getattr(_local, 'profiler', None) is self:
+            _local.profiler = None
+        self.loop.profiler = None
+        self._redispatch()
+        if not _profilers:
+            EventEmitter.emit = _plain_emit
+
+    def clear(self):
+        "Forget the results so far."
+        self.entries.clear()
+
+    def _redispatch(self):
+        "Rebuild the loop's dispatch table, to add or remove timing."
+        for fd, target in list(self.loop._fd_targets.items()):
+            self.loop._dispatch_add(fd, target)
+
+    def wrap(self, callback, source, event):
+        "Return a version of callback that's timed."
+        key = (source, event, callback_name(callback))
+        def timed(*args):
+            start = perf_counter()
+            try:
+                return callback(*args)
+            finally:
+                self.record(key, perf_counter() - start)
+        return timed
+
+    def call(self, callback, args, source, event=None):
+        "Call callback with args, timing it."
+        start = perf_counter()
+        try:
+            return callback(*args)
+        finally:
+            self.record((source, event, callback_name(callback)),
+                        perf_counter() - start)
+
+    def record(self, key, secs):
+        "Note that the callback identified by key ran for secs seconds."
+        try:
+            histogram = self.entries[key]
+        except KeyError:
+            histogram = self.entries[key] = Histogram()
+        histogram.add(secs)
+
+    def top(self, count=10, by='total'):
+        """
+        Return a list of the count callbacks with the highest 'total', 'max'
+        or 'count', as dicts with 'source', 'event', 'callback', 'count',
+        'total', 'p99' and 'max' (times in seconds).
+        """
+        results = []
+        for (source, event, name), histogram in self.entries.items():
+            results.append({
+                'source': source,
+                'event': event,
+                'callback': name,
+                'count': histogram.count,
+                'total': histogram.total,
+                'p99': histogram.percentile(.99),
+                'max': histogram.max
+            })
+        results.sort(key=lambda r: r[by], reverse=True)
+        return results[:count]
+
+    def report(self, count=10, by='total'):
+        "Return the results of top() as a printable table."
+        lines = ["%8s %10s %10s %10s  %s" % (
+            'count', 'total ms', 'p99 ms', 'max ms', 'callback')]
+        for result in self.top(count, by):
+            where = result['source']
+            if result['event']:
+                where += " '%s'" % result['event']
+            lines.append("%8d %10.2f %10.3f %10.3f  %s: %s" % (
+                result['count'], result['total'] * 1000,
+                result['p99'] * 1000, result['max'] * 1000,
+                where, result['callback']))
+        return "\n".join(lines)
+
+
+def _current_profiler():
+    """
+    Return the started profiler for the loop running in this thread (or,
+    before it runs, the last one started in this thread), or None.
+    """
+    ident = threading.get_ident()
+    for loop, profiler in list(_profilers.items()):
+        if loop._thread_ident == ident:
+            return profiler
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None and profiler.loop._thread_ident is None:
+        return profiler
+    return None
+
+
+def _profiled_emit(self, event, *args):
+    "EventEmitter.emit, timing each listener while a profiler is started."
+    loop = getattr(self, '_loop', None)
+    if loop is None:
+        # e.g., HTTP exchanges; they run on the loop in this thread.
+        profiler = _current_profiler()
+    else:
+        profiler = _profilers.get(loop, None)
+    if profiler is None:
+        return _plain_emit(self, event, *args)
+    source = self.__class__.__name__
+    listeners = self.listeners(event)
+    if len(listeners):
+        for listener in listeners:
+            profiler.call(listener, args, source, event)
+    else:
+        sink_event = getattr(self._EventEmitter__sink, event, None)
+        if sink_event:
+            profiler.call(sink_event, args, source, event)
@@ -32,7 +32,7 @@ import sys
 import logging
 from urllib.parse import urlsplit, urlunsplit
 
-from thor.loop import _loop as global_loop
+import thor.loop
 from thor.events import EventEmitter
 from thor.tcp import TcpClient
 from thor.tls import TlsClient, TlsConfig
@@ -330,7 +330,7 @@ class SpdyClientSession(SpdySession):
         Set the read timeout associated to entity.
         """
         if self._read_timeout and entity._read_timeout_ev is None:
-            entity._read_timeout_ev = self._loop.schedule(
+            entity._read_timeout_ev = self._loop.schedule_timeout(
                 self._read_timeout, 
                 self._handle_error, 
                 error.ReadTimeoutError(kind),
@@ -534,8 +534,8 @@ class SpdyClient(EventEmitter):
         self._idle_timeout = idle_timeout if int(idle_timeout or 0) > 0 else None
         self._tls_config = tls_config
         self._sessions = dict()
-        self._loop = loop or global_loop
-        self._loop.on('stop', self.shutdown)
+        self._loop = loop or thor.loop._loop
+        self._loop.on('stop', self.shutdown, weak=True)
 
     def session(self, origin):
         """
@@ -34,7 +34,7 @@ import time
 from urllib.parse import urlunsplit, urlsplit
 from collections import defaultdict
 
-from thor.loop import _loop as global_loop
+import thor.loop
 from thor.events import EventEmitter
 from thor.spdy import error
 from thor.spdy.frames import *
@@ -276,12 +276,16 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
         error(err)
         close()
     """
+    _input_budget = 64 # frames to parse per loop iteration
+
     def __init__(self, is_client, idle_timeout=None, loop=None):
         EventEmitter.__init__(self)
         self.tcp_conn = None
-        self._loop = loop or global_loop
+        self._loop = loop or thor.loop._loop
         self._idle_timeout = idle_timeout if int(idle_timeout or 0) > 0 else None
         self._idle_timeout_ev = None
+        self._input_resume_ev = None
+        self._input_paused = False # by pause_input
         self._is_client = is_client
         self._origin = None # (host, port)
         self.frame_handlers = defaultdict(list)
@@ -295,6 +299,7 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
     def _reset(self):
         SpdyMessageHandler.__init__(self)
         self._clear_idle_timeout()
+        self._clear_input_resume()
         self._sent_goaway = False
         self._received_goaway = False
         self._closing = False
@@ -350,6 +355,9 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
         """
         Temporarily stop / restart receiving input from remote side.
         """
+        self._input_paused = paused
+        if self._input_deferred:
+            return # paused until _input_resume
         if self.tcp_conn and self.tcp_conn.tcp_connected:
             self.tcp_conn.pause(paused)
             
@@ -390,6 +398,7 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
             #self._origin = None # FIXME: do we want this?
         self._closing = False
         self._clear_idle_timeout()
+        self._clear_input_resume()
         self.emit('close')
         
     ### Output methods to be implemented by inheriting classes
@@ -404,8 +413,7 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
         raise NotImplementedError
         
     def _output(self, chunk):
-        self._clear_idle_timeout()
-        self._set_idle_timeout()
+        self._refresh_idle_timeout()
         if self.tcp_conn and self.tcp_conn.tcp_connected:
             self.tcp_conn.write(chunk)
         if self._closing and not self._is_write_pending():
@@ -422,8 +430,7 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
         self.tcp_conn.on('data', self._handle_input)
         self.tcp_conn.on('close', self._handle_closed)
         self.tcp_conn.on('pause', self._handle_pause)
-        self._clear_idle_timeout()
-        self._set_idle_timeout()
+        self._refresh_idle_timeout()
         self._closing = False
         self.emit('bound', tcp_conn)
         self._init_output() # kick the output buffer
@@ -515,7 +522,7 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
         ping_timer._ping_timestamp = time.time()
         ping_timer._pong_timestamp = None
         if ping_timer._ping_timeout and ping_timer._ping_timeout_ev is None:
-            ping_timer._ping_timeout_ev = self._loop.schedule(
+            ping_timer._ping_timeout_ev = self._loop.schedule_timeout(
                 ping_timer._ping_timeout,
                 self._notify_ping, ping_timer._ping_id, False, False)
     
@@ -553,13 +560,22 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
         Set the session idle timeout.
         """
         if self._idle_timeout and self._idle_timeout_ev is None:
-            self._idle_timeout_ev = self._loop.schedule(
+            self._idle_timeout_ev = self._loop.schedule_timeout(
                 self._idle_timeout,
                 self._handle_error,
                 error.IdleTimeoutError('No frame received for %d seconds.' 
                     % self._idle_timeout),
                 GoawayReasons.OK)
     
+    def _refresh_idle_timeout(self):
+        """
+        Push the session idle timeout back, setting it if necessary.
+        """
+        if not (self._idle_timeout_ev and
+                self._idle_timeout_ev.reset(self._idle_timeout)):
+            self._clear_idle_timeout()
+            self._set_idle_timeout()
+
     def _clear_idle_timeout(self):
         """
         Clear the session idle timeout.
@@ -568,6 +584,31 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
             self._idle_timeout_ev.delete()
             self._idle_timeout_ev = None
 
+    ### Input deferral
+
+    def _input_defer(self):
+        """
+        Parse the rest of the input on the next loop iteration, leaving any
+        more in the kernel until then.
+        """
+        self.tcp_conn.pause(True)
+        self._input_resume_ev = self._loop.call_soon(self._input_resume)
+
+    def _input_resume(self):
+        self._input_resume_ev = None
+        SpdyMessageHandler._input_resume(self)
+        if not self._input_deferred and not self._input_paused and \
+          self.tcp_conn and self.tcp_conn.tcp_connected:
+            self.tcp_conn.pause(False)
+
+    def _clear_input_resume(self):
+        """
+        Forget about deferred input.
+        """
+        if self._input_resume_ev:
+            self._input_resume_ev.delete()
+            self._input_resume_ev = None
+
     ### Helper methods
     
     def _next_created_stream_id(self):
@@ -682,9 +723,16 @@ class SpdySession(SpdyMessageHandler, EventEmitter):
     ### Main frame handling method
     
     def _handle_frame(self, frame):
+        profiler = self._loop.profiler
+        if profiler is None:
+            self._run_frame_handlers(frame)
+        else:
+            profiler.call(self._run_frame_handlers, (frame,),
+                          self.__class__.__name__, frame.__class__.__name__)
+
+    def _run_frame_handlers(self, frame):
         self.emit('frame', frame)
-        self._clear_idle_timeout()
-        self._set_idle_timeout()
+        self._refresh_idle_timeout()
         for handler in self.frame_handlers.get(frame.type, []):
             handler(frame)
         
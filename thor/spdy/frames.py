@@ -632,9 +632,13 @@ class SpdyMessageHandler(object):
     """
     This is a base class for parsing SPDY frames.
     """
+    _input_budget = None # frames to parse per chunk of input; see _input_defer
+
     def __init__(self):
         self._input_buffer = bytes()
         self._input_state = InputStates.INIT
+        self._input_count = 0 # frames parsed from this chunk of input
+        self._input_deferred = False
         self._input_frame_type = None
         self._input_flags = None
         self._input_stream_id = None
@@ -665,6 +669,16 @@ class SpdyMessageHandler(object):
     def _handle_error(self, err, status, stream_id, fatal):
         raise NotImplementedError
 
+    ### input deferral to be implemented by inheriting classes
+
+    def _input_defer(self):
+        """
+        More than _input_budget frames have arrived in one chunk of input;
+        arrange for _input_resume to be called later (e.g., on the next loop
+        iteration), so that other sessions get a turn.
+        """
+        raise NotImplementedError
+
     ### frame parsing methods
 
     def _handle_input(self, data):
@@ -672,6 +686,23 @@ class SpdyMessageHandler(object):
         Given a chunk of input, figure out what state we're in and handle it,
         making the appropriate calls.
         """
+        if self._input_deferred: # keep it until we get back to it
+            self._input_buffer += data
+            return
+        self._input_count = 0
+        self._parse_input(data)
+
+    def _input_resume(self):
+        """
+        Parse the input left over by _input_defer.
+        """
+        self._input_deferred = False
+        self._handle_input(b'')
+
+    def _parse_input(self, data):
+        """
+        Parse a chunk of input.
+        """
         # TODO: look into reading/writing directly from the socket buffer with struct.pack_into / unpack_from.
         if len(self._input_buffer) > 0:
             data = self._input_buffer + data # will need to move to a list if writev comes around
@@ -699,7 +730,7 @@ class SpdyMessageHandler(object):
                     self._input_stream_id = d1 & STREAM_MASK
                 self._input_frame_len = (( d2 << 16 ) + d3)
                 self._input_state = InputStates.READING_FRAME_DATA
-                self._handle_input(data[8:])
+                self._parse_input(data[8:])
             else:
                 self._input_buffer = data
         elif self._input_state == InputStates.READING_FRAME_DATA:
@@ -779,8 +810,14 @@ class SpdyMessageHandler(object):
                     else: # this should not be reachable
                         raise Exception('Unknown frame type %d.' % self._input_frame_type)
                 self._input_state = InputStates.WAITING
-                if rest:
-                    self._handle_input(rest)
+                self._input_count += 1
+                if rest and self._input_budget and \
+                  self._input_count >= self._input_budget:
+                    self._input_buffer = rest
+                    self._input_deferred = True
+                    self._input_defer()
+                elif rest:
+                    self._parse_input(rest)
             else: # don't have complete frame yet
                 self._input_buffer = data
         else: # this should not be reachable
@@ -32,7 +32,7 @@ import sys
 import logging
 from urllib.parse import urlsplit, urlunsplit
 
-from thor.loop import _loop as global_loop
+import thor.loop
 from thor.events import EventEmitter
 from thor.tcp import TcpServer
 from thor.tls import TlsServer, TlsConfig
@@ -321,7 +321,7 @@ class SpdyServerSession(SpdySession):
         
     def _schedule_write(self):
         if not self._write_pending:
-            self._loop.schedule(0, self._write_frame_callback)
+            self._loop.call_soon(self._write_frame_callback)
             self._write_pending = True
 
     def _queue_frame(self, frame, priority=Priority.MIN):
@@ -473,20 +473,22 @@ class SpdyServer(EventEmitter):
             port=8080,
             idle_timeout=None, # seconds a conn is kept open until a frame is received
             tls_config=None,
-            loop=None):
+            loop=None,
+            reuse_port=False):
         EventEmitter.__init__(self)
         self._host = host
         self._port = port
         self._idle_timeout = idle_timeout if int(idle_timeout or 0) > 0 else None
         self._tls_config = tls_config
-        self._loop = loop or global_loop
-        self._loop.on('stop', self.shutdown)
+        self._loop = loop or thor.loop._loop
+        self._loop.on('stop', self.shutdown, weak=True)
         if tls_config is None:
             self._tcp_server = self.tcp_server_class(
-                host, port, loop=self._loop)
+                host, port, loop=self._loop, reuse_port=reuse_port)
         else:
             self._tcp_server = self.tls_server_class(
-                host, port, tls_config, loop=self._loop)
+                host, port, tls_config, loop=self._loop,
+                reuse_port=reuse_port)
         self._tcp_server.on('connect', self._handle_conn)
         self._tcp_server.on('connect_error', self._handle_error)
          
@@ -34,12 +34,19 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+from collections import deque
+from itertools import islice
 import errno
 import os
 import sys
 import socket
 
-from thor.loop import EventSource, schedule
+from thor.loop import EventSource
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX') # buffers per sendmsg call
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16
 
 
 class TcpConnection(EventSource):
@@ -58,6 +65,14 @@ class TcpConnection(EventSource):
     >   print "got some data:", data
     > tcp_conn.on('data', process)
 
+    Listeners that only look at the data while they're called (e.g., to
+    parse or copy it) can avoid a copy by being wrapped in BufferListener;
+    if all of the 'data' listeners are, chunks are read into a buffer
+    shared by the loop, and passed as memoryviews that are only valid until
+    the listener returns.
+
+    > tcp_conn.on('data', BufferListener(process))
+
     When you want to write to the connection, just write to it:
 
     > tcp_conn.write(data)
@@ -68,6 +83,21 @@ class TcpConnection(EventSource):
 
     Note that this will flush any data already written.
 
+    To send part or all of a file without reading it into memory, use
+    sendfile; it's sent in order with anything else written:
+
+    > tcp_conn.sendfile(open(filename, 'rb'))
+
+    By default, everything written to a connection during a loop iteration
+    is sent together at the end of it; see write_policy. To hold on to
+    written data for longer (e.g., until a message is complete), cork the
+    connection, and uncork it when you're done:
+
+    > tcp_conn.cork()
+    > tcp_conn.write(headers)
+    > ...
+    > tcp_conn.uncork()
+
     If the other side closes the connection, The 'close' event will be
     emitted;
 
@@ -75,9 +105,9 @@ class TcpConnection(EventSource):
     >   print "oops, they don't like us any more..."
     > tcp_conn.on('close', handle_close)
 
-    If you write too much data to the connection and the buffers fill up,
-    pause_cb will be emitted with True to tell you to stop sending data
-    temporarily;
+    If you write too much data to the connection and more than
+    write_high_water bytes are buffered, 'pause' will be emitted with True
+    to tell you to stop sending data temporarily;
 
     > def handle_pause(paused):
     >   if paused:
@@ -86,8 +116,10 @@ class TcpConnection(EventSource):
     >       # it's OK to start again
     > tcp_conn.on('pause', handle_pause)
 
-    Note that this is advisory; if you ignore it, the data will still be
-    buffered, but the buffer will grow.
+    It's emitted with False once the buffer has drained to write_low_water
+    bytes. Note that this is advisory; if you ignore it, the data will
+    still be buffered, but the buffer will grow. write_buffered is the
+    number of bytes waiting to be sent.
 
     Likewise, if you want to pause the connection because your buffers
     are full, call pause;
@@ -98,13 +130,42 @@ class TcpConnection(EventSource):
 
     > tcp_conn.pause(False)
 
+    Alternatively, set read_high_water (and read_low_water) to have the
+    connection do that for you; it counts the bytes passed to 'data'
+    listeners in read_buffered, pausing itself when there are more than
+    read_high_water, until you tell it how many you've finished with:
+
+    > tcp_conn.consumed(len(data))
+
     NOTE that connections are paused to start with; if you want to start
     getting data from them, you'll need to pause(False).
     """
 
-    # TODO: play with various buffer sizes
-    write_bufsize = 16
+    _edge_triggered = True
+
+    # when to send written data: 'iteration' sends everything written
+    # during a loop iteration together, just before the loop polls;
+    # 'immediate' tries to send each write straight away, if nothing's
+    # waiting already (so several small writes in a row can be held up by
+    # Nagle's algorithm; cork them); 'poll' waits for the loop to report
+    # that the socket is writable.
+    write_policy = 'iteration'
+    # bytes buffered for writing before 'pause' is emitted with True, and
+    # the number it has to drain to before it's emitted with False.
+    write_high_water = 1024 * 64
+    write_low_water = 1024 * 16
+    # without sendmsg (e.g., TLS), small buffered writes are joined into
+    # sends of up to this many bytes.
+    write_joinsize = 1024 * 64
     read_bufsize = 1024 * 16
+    # with edge-triggered events, the most to read before letting other
+    # connections have a turn; the rest is read on the next loop iteration.
+    # None to read until the socket would block.
+    read_budget = 1024 * 256
+    # if set, bytes passed to 'data' listeners and not yet consumed() before
+    # the connection pauses itself, and the number that resumes it.
+    read_high_water = None
+    read_low_water = 0
 
     _block_errs = set([
         (BlockingIOError, errno.EAGAIN),
@@ -128,11 +189,22 @@ class TcpConnection(EventSource):
         self._input_paused = True # we start with input paused
         self._output_paused = False
         self._closing = False
-        self._write_buffer = []
-
-        self.register_fd(sock.fileno())
-        self.on('readable', self.handle_read)
-        self.on('writable', self.handle_write)
+        self._corked = False
+        self._write_pending = False # waiting to flush the write buffer
+        self._read_held = False # paused because of read_high_water
+        self.read_buffered = 0 # bytes passed to the app, not yet consumed
+        self.write_buffered = 0 # bytes waiting to be written
+        self._write_buffer = deque()
+        self._write_offset = 0 # bytes of the first buffer already sent
+        # a short read means the socket is drained, unless it's TLS.
+        self._short_read_drains = not hasattr(sock, 'pending')
+        # TLS sockets can't sendmsg.
+        self._scatter = self._short_read_drains and \
+          hasattr(socket.socket, 'sendmsg')
+
+        self.register_fd(sock.fileno(),
+                         on_readable=self.handle_read,
+                         on_writable=self.handle_write)
         self.on('close', self.handle_close)
 
     def __repr__(self):
@@ -145,37 +217,82 @@ class TcpConnection(EventSource):
             status.append('output paused')
         if self._closing:
             status.append('closing')
-        if self._write_buffer:
-            status.append('%s write buffered' % len(self._write_buffer))
+        if self._corked:
+            status.append('corked')
+        if self.read_buffered:
+            status.append('%s bytes read buffered' % self.read_buffered)
+        if self.write_buffered:
+            status.append('%s bytes write buffered' % self.write_buffered)
         return "<%s at %#x>" % (", ".join(status), id(self))
 
     def handle_read(self):
         "The connection has data read for reading"
-        try:
-            # TODO: look into recv_into (but see python issue7827)
-            data = self.socket.recv(self.read_bufsize)
-        except Exception as why:
-            err = (type(why), why.errno)
-            if err in self._block_errs:
-                return
-            elif err in self._close_errs:
+        budget = self.read_budget
+        while True:
+            listeners = self.listeners('data')
+            use_buffer = len(listeners) > 0 and \
+              all([type(l) is BufferListener for l in listeners])
+            try:
+                if use_buffer:
+                    buf = self._get_read_buffer()
+                    data = memoryview(buf)[
+                        :self.socket.recv_into(buf, self.read_bufsize)]
+                else:
+                    data = self.socket.recv(self.read_bufsize)
+            except Exception as why:
+                err = (type(why), why.errno)
+                if err in self._block_errs:
+                    return
+                elif err in self._close_errs:
+                    self.emit('close')
+                    return
+                else:
+                    raise
+            if len(data) == 0:
                 self.emit('close')
                 return
-            else:
-                raise
-        if data == b'':
-            self.emit('close')
-        else:
+            if self.read_high_water is not None:
+                self.read_buffered += len(data)
+                if self.read_buffered > self.read_high_water \
+                  and not self._input_paused:
+                    self.pause(True)
+                    self._read_held = True
             self.emit('data', data)
+            # with edge-triggered events, keep reading until we'd block.
+            if not self._loop.edge_triggered or self._input_paused \
+              or not self.tcp_connected:
+                return
+            if self._short_read_drains and len(data) < self.read_bufsize:
+                return
+            if budget is not None:
+                budget -= len(data)
+                if budget <= 0:
+                    self._loop.call_soon(self._read_deferred)
+                    return
+
+    def _get_read_buffer(self):
+        "Return the loop's read buffer, making sure it's big enough."
+        buf = self._loop._read_buffer
+        if buf is None or len(buf) < self.read_bufsize:
+            buf = self._loop._read_buffer = bytearray(self.read_bufsize)
+        return buf
+
+    def _read_deferred(self):
+        "Carry on reading data left over by handle_read."
+        if self.tcp_connected and not self._input_paused:
+            self.handle_read()
 
-    # TODO: try using buffer; see
-    # http://itamarst.org/writings/pycon05/fast.html
     def handle_write(self):
         "The connection is ready for writing; write any buffered data."
-        if len(self._write_buffer) > 0:
-            data = b''.join(self._write_buffer)
+        buf = self._write_buffer
+        while len(buf) > 0:
             try:
-                sent = self.socket.send(data) if len(data) > 0 else 0
+                if type(buf[0]) is FileRange:
+                    sent = self._send_file(buf[0])
+                elif self._scatter:
+                    sent = self.socket.sendmsg(self._write_chunks(IOV_MAX))
+                else:
+                    sent = self.socket.send(self._write_joined())
             except Exception as why:
                 err = (type(why), why.errno)
                 if err in self._block_errs:
@@ -185,36 +302,145 @@ class TcpConnection(EventSource):
                     return
                 else:
                     raise
-            if sent < len(data):
-                self._write_buffer = [data[sent:]]
-            else:
-                self._write_buffer = []
+            # drop what's been sent, and note how far into the next we got.
+            self.write_buffered -= sent
+            offset = self._write_offset + sent
+            while len(buf) > 0 and offset >= len(buf[0]):
+                offset -= len(buf[0])
+                buf.popleft()
+            self._write_offset = offset
+            # with edge-triggered events, keep writing until we'd block.
+            if not self._loop.edge_triggered:
+                break
         if self._output_paused and \
-          len(self._write_buffer) < self.write_bufsize:
+          self.write_buffered <= self.write_low_water:
             self._output_paused = False
             self.emit('pause', False)
         if self._closing:
             self.close()
         if len(self._write_buffer) == 0:
+            self._write_pending = False
             self.event_del('writable')
 
+    def _flush(self):
+        "Arrange for buffered data to be sent, according to write_policy."
+        self._write_pending = True
+        if self.write_policy == 'iteration':
+            self._loop.call_before_poll(self._flush_now)
+        elif self.write_policy == 'immediate':
+            self._flush_now()
+        else:
+            self.event_add('writable')
+
+    def _flush_now(self):
+        "Send what buffered data we can now, and the rest when writable."
+        if not self.tcp_connected:
+            return
+        self.handle_write()
+        if self._write_buffer and self.tcp_connected:
+            self.event_add('writable')
+
+    def _write_chunks(self, count):
+        "Return a list of up to count buffers to write next."
+        chunks = []
+        for chunk in islice(self._write_buffer, 0, count):
+            if type(chunk) is FileRange:
+                break
+            chunks.append(chunk)
+        if self._write_offset:
+            chunks[0] = memoryview(chunks[0])[self._write_offset:]
+        return chunks
+
+    def _write_joined(self):
+        """
+        Return the next data to write in one piece: the rest of the first
+        buffer, joined with any small ones after it.
+        """
+        first = memoryview(self._write_buffer[0])[self._write_offset:]
+        size = len(first)
+        count = 1
+        for chunk in islice(self._write_buffer, 1, None):
+            size += len(chunk)
+            if size > self.write_joinsize or type(chunk) is FileRange:
+                break
+            count += 1
+        if count == 1:
+            return first
+        return b''.join(self._write_chunks(count))
+
+    def _send_file(self, file_range):
+        """
+        Send what we can of the rest of file_range, returning the number of
+        bytes sent.
+        """
+        offset = file_range.offset + self._write_offset
+        count = file_range.count - self._write_offset
+        if self._scatter and hasattr(os, 'sendfile'):
+            sent = os.sendfile(
+                self.socket.fileno(), file_range.fd, offset, count)
+        else: # TLS has to see the data.
+            data = os.pread(
+                file_range.fd, min(count, self.write_joinsize), offset)
+            sent = data and self.socket.send(data)
+        if not sent:
+            # the file is shorter than it was; we can't send what's owed.
+            raise ConnectionAbortedError(errno.ECONNABORTED,
+                "%r ended early" % file_range.file)
+        return sent
+
     def handle_close(self):
         """
         The connection has been closed by the other side.
         """
         self.tcp_connected = False
         # TODO: make sure removing close doesn't cause problems.
-        self.removeListeners('readable', 'writable', 'close')
+        self.removeListeners('close')
         self.unregister_fd()
         self.socket.close()
 
     def write(self, data):
         "Write data to the connection."
         self._write_buffer.append(data)
-        if len(self._write_buffer) > self.write_bufsize:
+        self.write_buffered += len(data)
+        if self.write_buffered > self.write_high_water \
+          and not self._output_paused:
             self._output_paused = True
             self.emit('pause', True)
-        self.event_add('writable')
+        # a corked connection still sends once it's over the high water
+        # mark, so that it can drain and unpause.
+        if not self._write_pending and (not self._corked or
+          self.write_buffered > self.write_high_water):
+            self._flush()
+
+    def sendfile(self, file, offset=0, count=None):
+        """
+        Send count bytes of file (a file object or descriptor) to the
+        connection, starting at offset; if count is None, to the end of the
+        file. Like write, it's sent in turn with other data, and counts
+        towards write_buffered.
+
+        The file is read when it's sent (using the sendfile system call,
+        where possible); don't change or close it until then. The
+        connection keeps a reference to it until it's sent.
+        """
+        fd = file if isinstance(file, int) else file.fileno()
+        if count is None:
+            count = os.fstat(fd).st_size - offset
+        if count > 0:
+            self.write(FileRange(file, fd, offset, count))
+
+    def cork(self):
+        """
+        Hold on to written data until uncork is called (or too much is
+        buffered; see write_high_water).
+        """
+        self._corked = True
+
+    def uncork(self):
+        "Send data held since cork was called, according to write_policy."
+        self._corked = False
+        if self._write_buffer and not self._write_pending:
+            self._flush()
 
     def pause(self, paused):
         """
@@ -226,18 +452,71 @@ class TcpConnection(EventSource):
         else:
             self.event_add('readable')
         self._input_paused = paused
+        self._read_held = False
+
+    def consumed(self, nbytes):
+        """
+        Tell the connection that the app has finished with nbytes of the
+        data it's been given; see read_high_water.
+        """
+        self.read_buffered = max(self.read_buffered - nbytes, 0)
+        if self._read_held and self.read_buffered <= self.read_low_water \
+          and self.tcp_connected:
+            self.pause(False)
 
     def close(self):
         "Flush buffered data (if any) and close the connection."
         self.pause(True)
         if len(self._write_buffer) > 0:
             self._closing = True
+            self.uncork()
         else:
             self.handle_close()
 
         # TODO: should loop stop automatically close all conns?
 
         
+class FileRange(object):
+    "Part of a file waiting to be sent by a TcpConnection; see sendfile."
+    __slots__ = ('file', 'fd', 'offset', 'count')
+
+    def __init__(self, file, fd, offset, count):
+        self.file = file
+        self.fd = fd
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+
+class BufferListener(object):
+    """
+    Wraps a 'data' listener that accepts memoryviews of a shared buffer;
+    see TcpConnection. Compares equal to the listener, so that it can be
+    removed with removeListener.
+    """
+    __slots__ = ('listener',)
+
+    def __init__(self, listener):
+        self.listener = listener
+
+    def __repr__(self):
+        return "<%s.%s for %r>" % (
+            self.__class__.__module__, self.__class__.__name__,
+            self.listener)
+
+    def __call__(self, data):
+        self.listener(data)
+
+    def __eq__(self, other):
+        if isinstance(other, BufferListener):
+            return self.listener == other.listener
+        return self.listener == other
+
+    __hash__ = None
+
+
 class TcpServer(EventSource):
     """
     An asynchronous TCP server.
@@ -251,26 +530,62 @@ class TcpServer(EventSource):
     > s.on('connect', conn_handler)
 
     conn_handler is called every time a new client connects.
+
+    If reuse_port is True, other servers can listen to the same host and
+    port (e.g., one per loop, with LoopThreads); the system spreads new
+    connections between them.
+
+    Socket options in sock_options are set on the listening socket, so
+    that accepted connections inherit them without a system call each;
+
+    > TcpServer.sock_options = [
+    >     (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
     """
-    def __init__(self, host, port, sock=None, loop=None):
+    _edge_triggered = True
+
+    # connections to accept each time the listening socket is readable;
+    # the rest wait for the next loop iteration.
+    accept_batch = 64
+    # (level, option, value) for the listening socket and so its connections
+    sock_options = []
+
+    def __init__(self, host, port, sock=None, loop=None, reuse_port=False):
         EventSource.__init__(self, loop)
         self.host = host
         self.port = port
-        self.sock = sock or server_listen(host, port)
-        self.on('readable', self.handle_accept)
-        self.register_fd(self.sock.fileno(), 'readable')
-        schedule(0, self.emit, 'start')
+        self.sock = sock or server_listen(host, port, reuse_port=reuse_port,
+                                          options=self.sock_options)
+        self.register_fd(self.sock.fileno(), 'readable',
+                         on_readable=self.handle_accept)
+        self._loop.call_soon(self.emit, 'start')
 
     def handle_accept(self):
-        try:
-            conn, addr = self.sock.accept()
-        except (TypeError, IndexError):
-            # sometimes accept() returns None if we have
-            # multiple processes listening
-            return
-        conn.setblocking(False)
-        self.create_conn(conn, addr[0], addr[1])
-        
+        "Accept up to accept_batch waiting connections."
+        for i in range(self.accept_batch):
+            try:
+                conn, addr = self.sock.accept()
+            except (TypeError, IndexError):
+                # sometimes accept() returns None if we have
+                # multiple processes listening
+                return
+            except BlockingIOError:
+                return
+            except ConnectionAbortedError:
+                continue # gone before we got to it
+            # Python's accept() doesn't take SOCK_NONBLOCK.
+            conn.setblocking(False)
+            self.create_conn(conn, addr[0], addr[1])
+            if self._fd is None: # shut down
+                return
+        # edge-triggered events won't tell us about the rest again.
+        if self._loop.edge_triggered:
+            self._loop.call_soon(self._accept_deferred)
+
+    def _accept_deferred(self):
+        "Carry on accepting connections left over by handle_accept."
+        if self._fd is not None:
+            self.handle_accept()
+
     def create_conn(self, sock, host, port):
         tcp_conn = TcpConnection(sock, host, port, self._loop)
         self.emit('connect', tcp_conn)        
@@ -279,18 +594,26 @@ class TcpServer(EventSource):
 
     def shutdown(self):
         "Stop accepting requests and close the listening socket."
-        self.removeListeners('readable')
+        self.unregister_fd()
         self.sock.close()
         self.emit('stop')
         # TODO: emit close?
 
 
-def server_listen(host, port, backlog=None):
-    "Return a socket listening to host:port."
+def server_listen(host, port, backlog=None, reuse_port=False, options=()):
+    """
+    Return a socket listening to host:port. If reuse_port is True, set
+    SO_REUSEPORT so that several sockets can share it. options is a list of
+    (level, option, value) to set on it.
+    """
     # TODO: IPV6
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.setblocking(False)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    for level, option, value in options:
+        sock.setsockopt(level, option, value)
     sock.bind((host, port))
     sock.listen(backlog or socket.SOMAXCONN)
     return sock
@@ -352,7 +675,7 @@ class TcpClient(EventSource):
             self.handle_conn_error(socket.error, [err, os.strerror(err)])
             return
         if connect_timeout:
-            self._timeout_ev = self._loop.schedule(
+            self._timeout_ev = self._loop.schedule_timeout(
                 connect_timeout,
                 self.handle_conn_error,
                 TimeoutError,
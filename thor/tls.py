@@ -178,8 +178,9 @@ class TlsServer(TcpServer):
 
     conn_handler is called every time a new client connects.
     """
-    def __init__(self, host, port, tls_config=None, sock=None, loop=None):
-        TcpServer.__init__(self, host, port, sock, loop)
+    def __init__(self, host, port, tls_config=None, sock=None, loop=None,
+                 reuse_port=False):
+        TcpServer.__init__(self, host, port, sock, loop, reuse_port)
         self.tls_config = tls_config or TlsConfig()
         
     def create_conn(self, sock, host, port):
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+A tracer that records what a loop spends its time on.
+
+While started, it records a span for each loop iteration, poll and batch of
+callbacks, and for every callback the loop runs -- fd event handlers (e.g.,
+TcpConnection reads and writes), EventEmitter listeners (e.g., exchange
+events), scheduled events, timeouts and SPDY frame handlers. Spans are kept
+in a fixed-size ring, so the most recent ones are available on demand:
+
+> tracer = Tracer(loop)
+> tracer.start()
+> ...
+> tracer.dump(open('thor.trace', 'w'))
+
+The dump is in Chrome's trace event format; load it in chrome://tracing or
+Perfetto. To see both halves of an intermediary together, start a tracer on
+each loop and pass them all to dump().
+"""
+
+__author__ = "Mark Nottingham <mnot@mnot.net>"
+__copyright__ = """\
+Copyright (c) 2005-2013 Mark Nottingham
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from array import array
+import json
+import os
+from time import monotonic
+
+from thor.profiler import Profiler, callback_name
+
+
+class Tracer(Profiler):
+    """
+    Records the callbacks run by loop as spans, keeping the last size.
+
+    It uses the same hooks as Profiler, so only one of them can be started
+    on a loop at a time.
+    """
+
+    def __init__(self, loop, size=65536):
+        Profiler.__init__(self, loop)
+        self.size = size
+        self.recorded = 0 # spans recorded; those over size are overwritten
+        self._keys = [None] * size # (source, event, callback name)
+        self._starts = array('d', [0.0] * size) # monotonic seconds
+        self._ends = array('d', [0.0] * size)
+
+    def start(self):
+        "Start recording."
+        Profiler.start(self)
+        self.loop.tracer = self
+
+    def stop(self):
+        "Stop recording; spans are kept."
+        if self.loop.tracer is self:
+            self.loop.tracer = None
+        Profiler.stop(self)
+
+    def clear(self):
+        "Forget the spans so far."
+        self.recorded = 0
+        for i in range(self.size):
+            self._keys[i] = None
+
+    def wrap(self, callback, source, event):
+        "Return a version of callback that's recorded."
+        key = (source, event, callback_name(callback))
+        def traced(*args):
+            start = monotonic()
+            try:
+                return callback(*args)
+            finally:
+                self.span(key, start, monotonic())
+        return traced
+
+    def call(self, callback, args, source, event=None):
+        "Call callback with args, recording it."
+        start = monotonic()
+        try:
+            return callback(*args)
+        finally:
+            self.span((source, event, callback_name(callback)),
+                      start, monotonic())
+
+    def record(self, key, secs):
+        "Note that the callback identified by key just ran for secs seconds."
+        end = monotonic()
+        self.span(key, end - secs, end)
+
+    def span(self, key, start, end):
+        """
+        Note that what key identifies ran from start to end (monotonic
+        seconds).
+        """
+        i = self.recorded % self.size
+        self._keys[i] = key
+        self._starts[i] = start
+        self._ends[i] = end
+        self.recorded += 1
+
+    def loop_span(self, name, start, end):
+        "Note that the loop's name phase ran from start to end."
+        self.span(('loop', name, None), start, end)
+
+    def spans(self):
+        """
+        Return the spans kept, in the order they ended, as a list of
+        (source, event, callback name, start, end) tuples.
+        """
+        if self.recorded > self.size:
+            order = list(range(self.recorded % self.size, self.size)) + \
+                    list(range(self.recorded % self.size))
+        else:
+            order = range(self.recorded)
+        return [self._keys[i] + (self._starts[i], self._ends[i])
+                for i in order]
+
+    def trace_events(self):
+        "Return the spans kept as a list of Chrome trace events."
+        pid = os.getpid()
+        tid = self.loop._thread_ident or id(self.loop)
+        events = []
+        for source, event, name, start, end in self.spans():
+            events.append({
+                'name': "%s %s" % (source, event or name),
+                'cat': source,
+                'ph': 'X',
+                'ts': start * 1000000,
+                'dur': (end - start) * 1000000,
+                'pid': pid,
+                'tid': tid,
+                'args': {'callback': name} if name else {}
+            })
+        return events
+
+    def dump(self, fp, *others):
+        """
+        Write the spans kept by this tracer (and any others) to the file
+        object fp, in Chrome trace format.
+        """
+        events = []
+        for tracer in (self,) + others:
+            events.extend(tracer.trace_events())
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
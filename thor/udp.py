@@ -60,8 +60,8 @@ class UdpEndpoint(EventSource):
         self.max_dgram = min((2**16 - 40), self.sock.getsockopt(
             socket.SOL_SOCKET, socket.SO_SNDBUF
         ))
-        self.on('readable', self.handle_datagram)
-        self.register_fd(self.sock.fileno())
+        self.register_fd(self.sock.fileno(),
+                         on_readable=self.handle_datagram)
 
     def bind(self, host, port):
         """
@@ -76,7 +76,7 @@ class UdpEndpoint(EventSource):
 
     def shutdown(self):
         "Close the listening socket."
-        self.removeListeners('readable')
+        self.unregister_fd()
         self.sock.close()
         # TODO: emit close?
 